@@ -0,0 +1,431 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The copyright for song <Still Alive> belongs to Jonathan Coulton and Valve Software
+# Contact me if there's copyright violation and if deletion of the content is needed.
+#
+# ASCII arts and credits of the PORTAL--STILL ALIVE demo, the lyrics are in
+# still_alive.lrc. still_alive_credit.py packs them into still_alive.pak and
+# memory-maps that, the pack is rebuilt whenever one of them is newer.
+
+
+a1 = ["              .,-:;//;:=,               ",
+      "          . :H@@@MM@M#H/.,+%;,          ",
+      "       ,/X+ +M@@M@MM%=,-%HMMM@X/,       ",
+      "     -+@MM; #M@@MH+-,;XMMMM@MMMM@+-     ",
+      "    ;@M@@M- XM@X;. -+XXXXXHHH@M@M#@/.   ",
+      "  ,%MM@@MH ,@%=            .---=-=:=,.  ",
+      "  =@#@@@MX .,              -%HX##%%%+;  ",
+      " =-./@M@M$                  .;@MMMM@MM: ",
+      " X@/ -#MM/                    .+MM@@@M$ ",
+      ",@M@H: :@:                    . =X#@@@@-",
+      ",@@@MMX, .                    /H- ;@M@M=",
+      ".H@@@@M@+,                    %MM+..%#$.",
+      " /MMMM@MMH/.                  XM@MH; =; ",
+      "  /%+%#XHH@$=              , .H@@@@MX,  ",
+      "   .=--------.           -%H.,@@@@@MX,  ",
+      "   .%MM@@@HHHXX###%+= .:#MMX =M@@MM%.   ",
+      "     =XMMM@MM@MM#H;,-+HMM@M+ /MMMX=     ",
+      "       =%@M@M#@$-.=#@MM@@@M; %M%=       ",
+      "         ,:+$+-,/H#MMMMMMM@= =,         ",
+      "               =++%%%%+/:-.             "]
+
+a2 = ["             =+$HM####@H%;,             ",
+      "          /H###############M$,          ",
+      "          ,@################+           ",
+      "           .H##############+            ",
+      "             X############/             ",
+      "              $##########/              ",
+      "               %########/               ",
+      "                /X/;;+X/                ",
+      "                 -XHHX-                 ",
+      "                ,######,                ",
+      "#############X  .M####M.  X#############",
+      "##############-   -//-   -##############",
+      "X##############%,      ,+##############X",
+      "-##############X        X##############-",
+      " %############%          %############% ",
+      "  %##########;            ;##########%  ",
+      "   ;#######M=              =M#######;   ",
+      "    .+M###@,                ,@###M+.    ",
+      "       :XH.                  .HX:       ",
+      "                                        "]
+
+a3 = ["                 =/;;/-                 ",
+      "                +:    //                ",
+      "               /;      /;               ",
+      "              -X        H.              ",
+      ".//;;;:;;-,   X=        :+   .-;:=;:;%;.",
+      "M-       ,=;;;#:,      ,:#;;:=,       ,@",
+      ":%           :%.=/++++/=.$=           %=",
+      " ,%;         %/:+/;,,/++:+/         ;+. ",
+      "   ,+/.    ,;@+,        ,%H;,    ,/+,   ",
+      "      ;+;;/= @.  .H##X   -X :///+;      ",
+      "      ;+=;;;.@,  .XM@$.  =X.//;=%/.     ",
+      "   ,;:      :@%=        =$H:     .+%-   ",
+      " ,%=         %;-///==///-//         =%, ",
+      ";+           :%-;;;:;;;;-X-           +:",
+      "@-      .-;;;;M-        =M/;;;-.      -X",
+      " :;;::;;-.    %-        :+    ,-;;-;:== ",
+      "              ,X        H.              ",
+      "               ;/      %=               ",
+      "                //    +;                ",
+      "                 ,////,                 "]
+
+a4 = ["                          .,---.        ",
+      "                        ,/XM#MMMX;,     ",
+      "                      -%##########M%,   ",
+      "                     -@######%  $###@=  ",
+      "      .,--,         -H#######$   $###M: ",
+      "   ,;$M###MMX;     .;##########$;HM###X=",
+      " ,/@##########H=      ;################+",
+      "-+#############M/,      %##############+",
+      "%M###############=      /##############:",
+      "H################      .M#############;.",
+      "@###############M      ,@###########M:. ",
+      "X################,      -$=X#######@:   ",
+      "/@##################%-     +######$-    ",
+      ".;##################X     .X#####+,     ",
+      " .;H################/     -X####+.      ",
+      "   ,;X##############,       .MM/        ",
+      "      ,:+$H@M#######M#$-    .$$=        ",
+      "           .,-=;+$@###X:    ;/=.        ",
+      "                  .,/X$;   .::,         ",
+      "                      .,    ..          "]
+
+a5 = ["            .+                          ",
+      "             /M;                        ",
+      "              H#@:              ;,      ",
+      "              -###H-          -@/       ",
+      "               %####$.  -;  .%#X        ",
+      "                M#####+;#H :M#M.        ",
+      "..          .+/;%#########X###-         ",
+      " -/%H%+;-,    +##############/          ",
+      "    .:$M###MH$%+############X  ,--=;-   ",
+      "        -/H#####################H+=.    ",
+      "           .+#################X.        ",
+      "         =%M####################H;.     ",
+      "            /@###############+;;/%%;,   ",
+      "         -%###################$.        ",
+      "       ;H######################M=       ",
+      "    ,%#####MH$%;+#####M###-/@####%      ",
+      "  :$H%+;=-      -####X.,H#   -+M##@-    ",
+      " .              ,###;    ;      =$##+   ",
+      "                .#H,               :XH, ",
+      "                 +                   .;-"]
+
+a6 = ["                     -$-                ",
+      "                    .H##H,              ",
+      "                   +######+             ",
+      "                .+#########H.           ",
+      "              -$############@.          ",
+      "            =H###############@  -X:     ",
+      "          .$##################:  @#@-   ",
+      "     ,;  .M###################;  H###;  ",
+      "   ;@#:  @###################@  ,#####: ",
+      " -M###.  M#################@.  ;######H ",
+      " M####-  +###############$   =@#######X ",
+      " H####$   -M###########+   :#########M, ",
+      "  /####X-   =########%   :M########@/.  ",
+      "    ,;%H@X;   .$###X   :##MM@%+;:-      ",
+      "                 ..                     ",
+      "  -/;:-,.              ,,-==+M########H ",
+      " -##################@HX%%+%%$%%%+:,,    ",
+      "   .-/H%%%+%%$H@###############M@+=:/+: ",
+      "/XHX%:#####MH%=    ,---:;;;;/%%XHM,:###$",
+      "$@#MX %+;-                           .  "]
+
+a7 = ["                                     :X-",
+      "                                  :X### ",
+      "                                ;@####@ ",
+      "                              ;M######X ",
+      "                            -@########$ ",
+      "                          .$##########@ ",
+      "                         =M############-",
+      "                        +##############$",
+      "                      .H############$=. ",
+      "         ,/:         ,M##########M;.    ",
+      "      -+@###;       =##########M;       ",
+      "   =%M#######;     :#########M/         ",
+      "-$M###########;   :#########/           ",
+      " ,;X###########; =########$.            ",
+      "     ;H#########+#######M=              ",
+      "       ,+##############+                ",
+      "          /M#########@-                 ",
+      "            ;M######%                   ",
+      "              +####:                    ",
+      "               ,$M-                     "]
+
+a8 = ["           .-;+$XHHHHHHX$+;-.           ",
+      "        ,;X@@X%/;=----=:/%X@@X/,        ",
+      "      =$@@%=.              .=+H@X:      ",
+      "    -XMX:                      =XMX=    ",
+      "   /@@:                          =H@+   ",
+      "  %@X,                            .$@$  ",
+      " +@X.                               $@% ",
+      "-@@,                                .@@=",
+      "%@%                                  +@$",
+      "H@:                                  :@H",
+      "H@:         :HHHHHHHHHHHHHHHHHHX,    =@H",
+      "%@%         ;@M@@@@@@@@@@@@@@@@@H-   +@$",
+      "=@@,        :@@@@@@@@@@@@@@@@@@@@@= .@@:",
+      " +@X        :@@@@@@@@@@@@@@@M@@@@@@:%@% ",
+      "  $@$,      ;@@@@@@@@@@@@@@@@@M@@@@@@$. ",
+      "   +@@HHHHHHH@@@@@@@@@@@@@@@@@@@@@@@+   ",
+      "    =X@@@@@@@@@@@@@@@@@@@@@@@@@@@@X=    ",
+      "      :$@@@@@@@@@@@@@@@@@@@M@@@@$:      ",
+      "        ,;$@@@@@@@@@@@@@@@@@@X/-        ",
+      "           .-;+$XXHHHHHX$+;-.           "]
+
+a9 = ["            ,:/+/-                      ",
+      "            /M/              .,-=;//;-  ",
+      "       .:/= ;MH/,    ,=/+%$XH@MM#@:     ",
+      "      -$##@+$###@H@MMM#######H:.    -/H#",
+      " .,H@H@ X######@ -H#####@+-     -+H###@ ",
+      "  .,@##H;      +XM##M/,     =%@###@X;-  ",
+      "X%-  :M##########$.    .:%M###@%:       ",
+      "M##H,   +H@@@$/-.  ,;$M###@%,          -",
+      "M####M=,,---,.-%%H####M$:          ,+@##",
+      "@##################@/.         :%H##@$- ",
+      "M###############H,         ;HM##M$=     ",
+      "#################.    .=$M##M$=         ",
+      "################H..;XM##M$=          .:+",
+      "M###################@%=           =+@MH%",
+      "@################M/.          =+H#X%=   ",
+      "=+M##############M,       -/X#X+;.      ",
+      "  .;XM##########H=    ,/X#H+:,          ",
+      "     .=+HM######M+/+HM@+=.              ",
+      "         ,:/%XM####H/.                  ",
+      "              ,.:=-.                    "]
+
+a10 = ["       #+ @      # #              M#@   ",
+       " .    .X  X.%##@;# #   +@#######X. @#%  ",
+       "   ,==.   ,######M+  -#####%M####M-    #",
+       "  :H##M%:=##+ .M##M,;#####/+#######% ,M#",
+       " .M########=  =@#@.=#####M=M#######=  X#",
+       " :@@MMM##M.  -##M.,#######M#######. =  M",
+       "             @##..###:.    .H####. @@ X,",
+       "   ############: ###,/####;  /##= @#. M ",
+       "           ,M## ;##,@#M;/M#M  @# X#% X# ",
+       ".%=   ######M## ##.M#:   ./#M ,M #M ,#$ ",
+       "##/         $## #+;#: #### ;#/ M M- @# :",
+       "#+ #M@MM###M-;M #:$#-##$H# .#X @ + $#. #",
+       "      ######/.: #%=# M#:MM./#.-#  @#: H#",
+       "+,.=   @###: /@ %#,@  ##@X #,-#@.##% .@#",
+       "#####+;/##/ @##  @#,+       /#M    . X, ",
+       "   ;###M#@ M###H .#M-     ,##M  ;@@; ###",
+       "   .M#M##H ;####X ,@#######M/ -M###$  -H",
+       "    .M###%  X####H  .@@MM@;  ;@#M@      ",
+       "      H#M    /@####/      ,++.  / ==-,  ",
+       "               ,=/:, .+X@MMH@#H  #####$="]
+
+ascii_art = [a1, a2, a3, a4, a5, a6, a7, a8, a9, a10]
+
+credits = r""">LIST PERSONNEL
+            
+Gautam Babbar
+Ted Backman
+Kelly Bailey
+Jeff Ballinger
+Aaron Barber
+Jeep Barnett
+Jeremy Bennett
+Dan Berger
+Yahn Bernier
+Ken Birdwell
+Derrick BirumMike Blaszczak
+Iestyn Bleasdale-Shepherd
+Chris Bokitch
+Steve Bond
+Matt Boone
+Antoine Bourdon
+Jamaal Bradley
+Jason Brashill
+Charlie Brown
+Charlie Burgin
+Andrew Burke
+Augusta Butlin
+Julie Caldwell
+Dario Casali
+Chris Chin
+Jess Cliffe
+Phil Co
+John Cook
+Christen Coomer
+Greg Coomer
+Scott Dalton
+Kerry Davis
+Jason Deakins
+Joe Demers
+Ariel Diaz
+Quintin Doroquez
+Jim Dose
+Chris Douglass
+Laura Dubuk
+Mike Dunkle
+Mike Durand
+Mike Dussault
+Dhabih Eng
+Katie Engel
+Chet Faliszek
+Adrian Finol
+Bill Fletcher
+Moby Francke
+Stephane Gaudette
+Kathy Gehrig
+Vitaliy Genkin
+Paul Graham
+Chris Green
+Chris Grinstead
+John Guthrie
+Aaron Halifax
+Reagan Halifax
+Leslie Hall
+Jeff Hameluck
+Joe Han
+Don Holden
+Jason Holtman
+Gray Horsfield
+Keith Huggins
+Jim Hughes
+Jon Huisingh
+Brian Jacobson
+Lars Jensvold
+Erik Johnson
+Jakob Jungels
+Rich Kaethler
+Steve Kalning
+Aaron Kearly
+Iikka Keranen
+David Kircher
+Eric Kirchmer
+Scott Klintworth
+Alden Kroll
+Marc Laidlaw
+Jeff Lane
+Tim Larkin
+Dan LeFree
+Isabelle LeMay
+Tom Leonard
+Jeff Lind
+Doug Lombardi
+Bianca Loomis
+Richard Lord
+Realm Lovejoy
+Randy Lundeen
+Scott Lynch
+Ido Magal
+Nick Maggiore
+John McCaskey
+Patrick McClard
+Steve McClure
+Hamish McKenzie
+Gary McTaggart
+Jason Mitchell
+Mike Morasky
+John Morello II
+Bryn Moslow
+Arsenio Navarro
+Gabe Newell
+Milton Ngan
+Jake Nicholson
+Martin Otten
+Nick Papineau
+Karen Prell
+Bay Raitt
+Tristan Reidford
+Alfred Reynolds
+Matt Rhoten
+Garret Rickey
+Dave Riller
+Elan Ruskin
+Matthew Russell
+Jason Ruymen
+David Sawyer
+Marc Scaparro
+Wade Schin
+Matthew Scott
+Aaron Seeler
+Jennifer Seeley
+Taylor Sherman
+Eric Smith
+Jeff Sorensen
+David Speyrer
+Jay Stelly
+Jeremy Stone
+Eric Strand
+Kim Swift
+Kelly Thornton
+Eric Twelker
+Carl Uhlman
+Doug Valente
+Bill Van Buren
+Gabe Van Engel
+Alex Vlachos
+Robin Walker
+Joshua Weier
+Andrea Wicklund
+Greg Winkler
+Erik Wolpaw
+Doug Wood
+Matt T. Wood
+Danika Wright
+Matt Wright
+Shawn Zabecki
+Torsten Zabka 
+            
+            
+'Still Alive' by:
+Jonathan Coulton
+            
+Voices:
+Ellen McLain - GlaDOS, Turrets
+Mike Patton - THE ANGER SPHERE
+            
+Voice Casting:
+Shana Landsburg\Teri Fiddleman
+            
+Voice Recording:
+Pure Audio, Seattle, WA
+            
+Voice recording
+scheduling and logistics:
+Pat Cockburn, Pure Audio
+            
+Translations:
+SDL
+            
+Crack Legal Team:
+Liam Lavery
+Karl Quackenbush
+Kristen Boraas
+Kevin Rosenfield
+Alan Bruggeman
+Dennis Tessier
+            
+Thanks for the use of their face:
+Alesia Glidewell - Chell
+            
+Special thanks to everyone at:
+Alienware
+ATI
+Dell
+Falcon Northwest
+Havok
+SOFTIMAGE
+and Don Kemmis, SLK Technologies
+            
+            
+THANK YOU FOR PARTICIPATING
+IN THIS
+ENRICHMENT CENTER ACTIVITY!!"""
@@ -34,28 +34,287 @@ import os
 import shutil
 import re
 import signal
+import asyncio
+import heapq
+import collections
+import struct
+import mmap
+import bisect
+import json
+import concurrent.futures
+import selectors
+import itertools
+import wave
 from pathlib import Path
 
-cursor_x = 1
-cursor_y = 1
-print_lock = threading.Lock()
 
+# What every TERM can do is looked up once and cached here
+cache_dir = Path(os.getenv('XDG_CACHE_HOME', Path.home() / '.cache'))
+terminal_cache_path = cache_dir / 'still_alive_terminal.json'
+
+
+def terminfoCapabilities(name):
+    '''
+    ECH, EL, REP and back color erase from the terminfo entry of a
+    terminal. curses is set up only once in a process, so the entry is
+    read by a child process. Capabilities needing padding count as missing
+    '''
+    import subprocess
+    script = ('import curses, json, sys\n'
+              'curses.setupterm(sys.argv[1], sys.stdout.fileno())\n'
+              'caps = {c: curses.tigetstr(c) for c in ("ech", "el", "rep")}\n'
+              'caps = {c: bool(s) and b"$<" not in s for c, s in caps.items()}\n'
+              'caps["bce"] = curses.tigetflag("bce") > 0\n'
+              'json.dump(caps, sys.stdout)\n')
+    try:
+        result = subprocess.run([sys.executable, '-c', script, name],
+                                capture_output=True, text=True, timeout=5)
+        return json.loads(result.stdout)
+    except (OSError, ValueError, subprocess.SubprocessError):
+        return {}
+
+
+def terminalCapabilities(name, probed=None):
+    # From the cache, `probed` adds what the terminal answered to --probe
+    try:
+        cache = json.loads(terminal_cache_path.read_text())
+    except (OSError, ValueError):
+        cache = {}
+    if name not in cache or probed:
+        caps = cache.get(name) or terminfoCapabilities(name)
+        caps.update(probed or {})
+        cache[name] = caps
+        try:
+            terminal_cache_path.parent.mkdir(parents=True, exist_ok=True)
+            temp = terminal_cache_path.with_suffix('.%d' % os.getpid())
+            temp.write_text(json.dumps(cache))
+            os.replace(temp, terminal_cache_path)
+        except OSError:
+            pass
+    return cache[name]
+
+
+def detectTerminal(name, real_xterm=False):
+    global term, is_vt
+    global enable_screen_buffer, enable_color, enable_margins
+    global enable_ech, enable_el, enable_rep
+    term = name
+    is_vt = re.search(r"vt(\d+)", term)
+
+    # xterm, rxvt, konsole ...
+    # but fbcon in linux kernel does not support screen buffer
+    enable_screen_buffer = not (is_vt or term == "linux")
+
+    # color support is after VT241
+    enable_color = not is_vt or int(re.search(r"\d+", is_vt.group()).group()) >= 241
+
+    # The credits panel shares its rows with the lyrics, so scrolling it needs
+    # left/right margins (DECSLRM) besides DECSTBM. They come with VT420, and
+    # xterm has them but most terminals only claiming to be xterm do not
+    enable_margins = bool(is_vt and int(is_vt.group(1)) >= 420) or \
+        (term.startswith("xterm") and real_xterm)
+
+    # Erasing (ECH, EL) fills with the current colors only on terminals
+    # with back color erase. REP repeats the character before it
+    caps = terminalCapabilities(term)
+    erase = caps.get('bce', False) or not enable_color
+    enable_ech = caps.get('ech', False) and erase
+    enable_el = caps.get('el', False) and erase
+    enable_rep = caps.get('rep', False)
+    # The terminal itself told with --probe
+    enable_margins = caps.get('margins', enable_margins)
+
+
+detectTerminal(os.getenv("TERM", "vt100"), "XTERM_VERSION" in os.environ)
+
+
+def getOption(name, default=None):
+    if name in sys.argv:
+        i = sys.argv.index(name)
+        if i + 1 < len(sys.argv):
+            return sys.argv[i + 1]
+    return default
 
-term = os.getenv("TERM", "vt100")
-is_vt = re.search(r"vt(\d+)", term)
 
-# xterm, rxvt, konsole ...
-# but fbcon in linux kernel does not support screen buffer
-enable_screen_buffer = not (is_vt or term == "linux")
+enable_sound = '--no-sound' not in sys.argv
 
-# color support is after VT241
-enable_color = not is_vt or int(re.search(r"\d+", is_vt.group()).group()) >= 241
+# Print how late every timed event was after the show
+enable_timing = '--timing' in sys.argv
 
-enable_sound = '--no-sound' not in sys.argv
+# Milliseconds of output gathered into one write, 0 adapts to the line
+try:
+    tick_ms = float(getOption('--tick', 0))
+except ValueError:
+    print("--tick expects milliseconds, e.g. --tick 20")
+    sys.exit(1)
+
+# Run the real-time engine on a simulated clock and report what it sends
+enable_simulate = '--simulate' in sys.argv
+
+# Wait for the tty to transmit what was written before drawing more
+enable_drain = '--drain' in sys.argv
+
+# Line rate of a serial terminal, 0 means the output is not rate limited
+try:
+    baud_rate = int(getOption('--baud', 0))
+except ValueError:
+    print("--baud expects the line rate in bps, e.g. --baud 19200")
+    sys.exit(1)
 
-if enable_sound:
+# The lyrics follow the playback position of the music when the audio
+# backend reports it: a WAV file played into the null device, or a silent
+# clock running at a given rate against real time. playsound reports
+# nothing, with it the show runs on its own clock
+audio_wav = getOption('--wav')
+try:
+    audio_rate = float(getOption('--fake-audio', 0))
+except ValueError:
+    print("--fake-audio expects the rate of the audio clock, e.g. --fake-audio 1.02")
+    sys.exit(1)
+
+if enable_sound and not audio_wav and not audio_rate:
     import playsound
 
+
+# A compiled show is a header (terminal size, music start in milliseconds,
+# the lengths of the music file name and of the sequence restoring the
+# terminal), that name and sequence, then (milliseconds, length) records
+# each followed by the bytes to write
+show_magic = b'SAC2'
+show_header = struct.Struct('<4sHHIHH')
+show_record = struct.Struct('<II')
+show_no_music = 0xffffffff
+
+
+def writeAll(fd, data):
+    while data:
+        data = data[os.write(fd, data):]
+
+
+def playShow(path):
+    '''
+    Play a show made by --compile: the file is memory-mapped and every
+    record is written to the terminal at its time, nothing is rendered
+    '''
+    with open(path, 'rb') as f:
+        show = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    magic, columns, lines, music, name, length = show_header.unpack_from(show, 0)
+    if magic != show_magic:
+        print("%s is not a compiled show" % path)
+        sys.exit(1)
+    if (columns, lines) != (term_columns, term_lines):
+        print("%s was compiled for a %dx%d terminal, this one is %dx%d" %
+              (path, columns, lines, term_columns, term_lines))
+        sys.exit(1)
+    offset = show_header.size + name
+    sound = str(show[show_header.size:offset], 'utf-8')
+    end = bytes(show[offset:offset + length])
+    offset += length
+    fd = sys.stdout.fileno()
+
+    def interrupt(sig, frame):
+        writeAll(fd, end)
+        print('Interrupt by user')
+        sys.exit(0)
+    signal.signal(signal.SIGINT, interrupt)
+
+    startTime = time.monotonic()
+    while offset < len(show):
+        ms, size = show_record.unpack_from(show, offset)
+        offset += show_record.size
+        if ms >= music:
+            if enable_sound:
+                playsound.playsound(str(Path.cwd() / sound), False)
+            music = show_no_music
+        delay = startTime + ms / 1000.0 - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        writeAll(fd, show[offset:offset + size])
+        offset += size
+
+compile_path = getOption('--compile')
+
+# asciicast v2 (.cast) or ttyrec file to record the show to
+record_path = getOption('--record')
+
+# [HOST:]PORT to serve the show to telnet clients on
+serve_address = getOption('--serve')
+
+# Serial terminals to drive at once, DEVICE[:BAUD[:TERM[:COLUMNSxLINES]]]
+# separated by commas
+ports_spec = getOption('--ports')
+
+# Song timeline to play instead of still_alive.lrc
+song_path = getOption('--song')
+
+# JSON file the runtime metrics are saved to when the show ends
+metrics_path = getOption('--metrics')
+
+try:
+    benchmark_baud = int(getOption('--benchmark', 0))
+except ValueError:
+    print("--benchmark expects the simulated line rate in bps, e.g. --benchmark 19200")
+    sys.exit(1)
+
+
+def parseSeconds(value):
+    # 85, 85s or 1:25
+    minutes, _, seconds = value.rstrip('s').rpartition(':')
+    return int(minutes or 0) * 60 + float(seconds)
+
+
+# Song position to start the show at, and how fast it plays
+try:
+    start_at = parseSeconds(getOption('--start-at', '0'))
+    speed = float(getOption('--speed', 1.0))
+    if start_at < 0 or speed <= 0:
+        raise ValueError
+except ValueError:
+    print("--start-at expects a song position, e.g. --start-at 85s or 1:25, "
+          "and --speed a positive rate, e.g. --speed 2.0")
+    sys.exit(1)
+
+
+def probeTerminal():
+    '''
+    Ask the terminal on stdin and stdout with DECRQM whether it has
+    left/right margins (DECLRMM), and with DA1 its conformance level:
+    VT220 and later erase characters with ECH
+    '''
+    import termios
+    import tty
+    import select
+    fd = sys.stdin.fileno()
+    saved = termios.tcgetattr(fd)
+    answer = ''
+    try:
+        tty.setraw(fd)
+        # Every terminal answers DA1, so its answer comes last
+        writeAll(sys.stdout.fileno(), b'\033[?69$p\033[c')
+        deadline = time.monotonic() + 0.5
+        while not re.search(r'\033\[\?[\d;]*c', answer):
+            delay = deadline - time.monotonic()
+            if delay <= 0 or not select.select([fd], [], [], delay)[0]:
+                break
+            answer += os.read(fd, 64).decode('ascii', 'replace')
+    finally:
+        termios.tcsetattr(fd, termios.TCSADRAIN, saved)
+    probed = {}
+    da1 = re.search(r'\033\[\?(\d+)[\d;]*c', answer)
+    if da1:
+        probed['margins'] = bool(re.search(r'\033\[\?69;[123]\$y', answer))
+        if int(da1.group(1)) >= 62:
+            probed['ech'] = True
+    return probed
+
+
+if '--probe' in sys.argv:
+    if not (sys.stdin.isatty() and sys.stdout.isatty()):
+        print("--probe asks the terminal on stdin and stdout, they are not ttys")
+        sys.exit(1)
+    terminalCapabilities(term, probeTerminal())
+    detectTerminal(term, "XTERM_VERSION" in os.environ)
+
 term_columns, term_lines = 0, 0
 if is_vt:
     term_columns, term_lines = 80, 24
@@ -65,10 +324,15 @@ else:
 term_columns = int(os.getenv("COLUMNS", term_columns))
 term_lines = int(os.getenv("LINES", term_lines))
 
-if term_columns < 80 or term_lines < 24:
+# The server takes the size of every client instead
+if not (serve_address or ports_spec) and (term_columns < 80 or term_lines < 24):
     print("the terminal size should be at least 80x24")
     sys.exit(1)
 
+if getOption('--play'):
+    playShow(getOption('--play'))
+    sys.exit(0)
+
 is_draw_end = False
 
 def sigint_handler(sig, frame):
@@ -80,74 +344,401 @@ signal.signal(signal.SIGINT, sigint_handler)
 
 def begin_draw():
     if enable_screen_buffer:
-        print_lock.acquire()
-        print('\033[?1049h', end='')
-        print_lock.release()
+        output('raw', b'\033[?1049h')
+    if enable_margins:
+        output('raw', b'\033[?69h')
     if enable_color:
-        print_lock.acquire()
-        print('\033[33;40;1m', end='')
-        print_lock.release()
+        output('raw', b'\033[33;40;1m')
 
 
-def end_draw():
-    global is_draw_end
-    print_lock.acquire()
-    is_draw_end = True
+def endSequence():
+    # Restore the terminal, the player also sends this when interrupted
+    seq = ''
     if enable_color:
-        print('\033[0m', end='')
+        seq += '\033[0m'
+    if enable_margins:
+        seq += '\033[?69l'
     if enable_screen_buffer:
-        print('\033[?1049l', end='')
+        seq += '\033[?1049l'
     else:
-        clear(False)
-        move(1, 1, False, False)
-    print_lock.release()
-
-def move(x, y, update_cursor=True, mutex=True):
-    global cursor_x, cursor_y
-    global print_lock
-    if(mutex):
-        print_lock.acquire()
-    print("\033[%d;%dH" % (y, x), end='')
-    sys.stdout.flush()
-    if(update_cursor):
-        cursor_x = x
-        cursor_y = y
-    if(mutex):
-        print_lock.release()
-
-
-def clear(mutex=True):
-    global cursor_x, cursor_y
-    global print_lock
-    cursor_x = 1
-    cursor_y = 1
-    if mutex:
-        print_lock.acquire()
-    print('\033[2J', end='')
-    if mutex:
-        print_lock.release()
-
-# print with mutex lock and cursor update. Use this for convenience
+        seq += '\033[2J\033[H'
+    return seq
+
+
+def end_draw():
+    global is_draw_end
+    is_draw_end = True
+    output('raw', endSequence().encode())
+    output('end')
+    sync()
+    if metrics_path:
+        metrics.save(metrics_path)
+
+
+class screen_buffer:
+    '''
+    In-memory copy of the terminal screen. Drawing functions write cells
+    here, render() sends only the cells that changed since the last call,
+    so redrawing the same content costs no bytes on a slow serial line.
+    '''
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.cells = [[' '] * width for _ in range(height)]
+        self.shown = [[' '] * width for _ in range(height)]
+        self.dirty = set()
+        self.pending = ''
+        # Real cursor position on the terminal, None means unknown
+        self.term_x = None
+        self.term_y = None
+
+    def write(self, x, y, str):
+        if isinstance(str, memoryview):
+            # ASCII art rows come straight from the asset pack
+            str = str.tobytes().decode('ascii')
+        y = y - 1
+        if y < 0 or y >= self.height:
+            return
+        row = self.cells[y]
+        x = x - 1
+        for ch in str:
+            # NULs are sent as is to keep a serial line busy,
+            # they do not occupy a cell nor move the cursor
+            if ch == '\0':
+                self.pending += ch
+                continue
+            if 0 <= x < self.width and row[x] != ch:
+                row[x] = ch
+                self.dirty.add(y)
+            x = x + 1
+
+    def clear(self):
+        for y in range(self.height):
+            self.cells[y] = [' '] * self.width
+            self.shown[y] = [' '] * self.width
+        self.dirty.clear()
+        self.pending += '\033[2J'
+
+    def paint(self, rows, cursor_x, cursor_y):
+        '''
+        Take a whole screen rendered beforehand: the caller sends what
+        draws `rows` and leaves the cursor at (cursor_x, cursor_y)
+        '''
+        for y in range(self.height):
+            row = rows[y] if y < len(rows) else ''
+            self.cells[y] = list(row.ljust(self.width))
+            self.shown[y] = list(row.ljust(self.width))
+        self.dirty.clear()
+        self.term_x = cursor_x - 1
+        self.term_y = cursor_y - 1
+
+    def scroll(self, left, top, right, bottom):
+        '''
+        Scroll a rectangle up by one line with the terminal's margins
+        and return the escape sequence. Both the wanted and the shown
+        cells move, so only the new bottom line is left to draw
+        '''
+        for cells in (self.cells, self.shown):
+            for y in range(top - 1, bottom - 1):
+                cells[y][left - 1:right] = cells[y + 1][left - 1:right]
+            cells[bottom - 1][left - 1:right] = [' '] * (right - left + 1)
+        for y in range(top - 1, bottom - 1):
+            if y + 1 in self.dirty:
+                self.dirty.add(y)
+        # Setting margins homes the cursor, resetting them does it again
+        self.term_x = 0
+        self.term_y = 0
+        return '\033[%d;%dr\033[%d;%ds\033[S\033[s\033[r' % (top, bottom, left, right)
+
+    def span(self, row, x, end):
+        '''
+        Draw row[x:end] with the cursor at x. Runs of a character are
+        repeated with REP, runs of spaces erased with ECH, or with EL when
+        the rest of the row is blank, if the terminal has them and they
+        are shorter. Returns the bytes, the column they leave the cursor
+        at (None when unknown) and the column cells were drawn up to
+        '''
+        if not (enable_rep or enable_ech or enable_el):
+            text, cursor = ''.join(row[x:end]), end
+        else:
+            out = []
+            while x < end:
+                ch = row[x]
+                run = x + 1
+                while run < end and row[run] == ch:
+                    run = run + 1
+                best, cursor, drawn = ch * (run - x), run, run
+                if enable_rep and run - x > 2:
+                    rep = ch + '\033[%db' % (run - x - 1)
+                    if len(rep) < len(best):
+                        best = rep
+                if ch == ' ' and run == end and enable_el and \
+                        not ''.join(row[run:]).strip():
+                    if len(best) > 3:
+                        best, cursor, drawn = '\033[K', x, self.width
+                elif ch == ' ' and enable_ech:
+                    # ECH does not move the cursor
+                    ech = '\033[%dX' % (run - x)
+                    if run < end:
+                        ech += '\033[%dC' % (run - x)
+                    if len(ech) < len(best):
+                        best, cursor = ech, run if run < end else x
+                out.append(best)
+                x = drawn
+            text, end = ''.join(out), x
+        # Writing the last column leaves the cursor in a pending wrap
+        # state which differs between terminals
+        return text, cursor if cursor < self.width else None, end
+
+    def goto(self, x, y):
+        '''
+        Move the real cursor with the shortest sequence: absolute CUP,
+        relative CUU/CUD/CUF/CUB, BS, CR/LF, or resending the cells
+        the cursor passes over. Relative motions need a known position
+        '''
+        if x == self.term_x and y == self.term_y:
+            return ''
+        if x == 0:
+            moves = ['\033[%dH' % (y + 1) if y else '\033[H']
+        else:
+            moves = ['\033[%d;%dH' % (y + 1, x + 1)]
+        if self.term_x is not None:
+            dy = y - self.term_y
+            if dy < 0:
+                vertical = '\033[%dA' % -dy if dy < -1 else '\033[A'
+            elif dy > 0:
+                vertical = '\033[%dB' % dy if dy > 1 else '\033[B'
+            else:
+                vertical = ''
+            dx = x - self.term_x
+            if dx < 0:
+                horizontal = min('\b' * -dx,
+                                 '\033[%dD' % -dx if dx < -1 else '\033[D',
+                                 key=len)
+            elif dx > 0:
+                horizontal = min(''.join(self.shown[y][self.term_x:x]),
+                                 '\033[%dC' % dx if dx > 1 else '\033[C',
+                                 key=len)
+            else:
+                horizontal = ''
+            moves.append(vertical + horizontal)
+            if x == 0:
+                # LF would also return to column 1 with ONLCR, CR first
+                # keeps the result the same either way
+                moves.append('\r' + ('\n' * dy if dy > 0 else vertical))
+        self.term_x = x
+        self.term_y = y
+        return min(moves, key=len)
+
+    def render(self, cursor_x=None, cursor_y=None):
+        out = [self.pending]
+        self.pending = ''
+        for y in sorted(self.dirty):
+            row = self.cells[y]
+            shown = self.shown[y]
+            x = 0
+            while x < self.width:
+                if row[x] == shown[x]:
+                    x = x + 1
+                    continue
+                end = x + 1
+                while end < self.width and row[end] != shown[end]:
+                    end = end + 1
+                # A short gap of unchanged cells is resent by goto()
+                out.append(self.goto(x, y))
+                text, self.term_x, end = self.span(row, x, end)
+                out.append(text)
+                shown[x:end] = row[x:end]
+                x = end
+        self.dirty.clear()
+        if cursor_x is not None:
+            out.append(self.goto(min(cursor_x, self.width) - 1,
+                                 min(cursor_y, self.height) - 1))
+        return ''.join(out)
+
+
+# Clock of the draw commands and of the metrics, a simulation replaces it
+show_clock = time.monotonic
+
+
+class show_metrics:
+    '''
+    Counters filled by the writer: bytes and writes to the terminal, how
+    long draw commands waited in the queue, how long the writer was busy
+    with them, and bytes sent in every second of the show. The lateness
+    of timed events comes from the scheduler
+    '''
+    def __init__(self):
+        self.startTime = show_clock()
+        self.bytes = 0
+        self.flushes = 0
+        self.commands = 0
+        self.queue_wait = 0.0
+        self.queue_wait_max = 0.0
+        self.writer_busy = 0.0
+        self.bytes_per_second = []
+        self.lateness = []
+
+    def waited(self, wait):
+        self.commands += 1
+        self.queue_wait += wait
+        self.queue_wait_max = max(self.queue_wait_max, wait)
+
+    def wrote(self, size):
+        self.bytes += size
+        self.flushes += 1
+        second = int(show_clock() - self.startTime)
+        while len(self.bytes_per_second) <= second:
+            self.bytes_per_second.append(0)
+        self.bytes_per_second[second] += size
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump({
+                'bytes': self.bytes,
+                'flushes': self.flushes,
+                'commands': self.commands,
+                'queue_wait': self.queue_wait,
+                'queue_wait_max': self.queue_wait_max,
+                'writer_busy': self.writer_busy,
+                'lateness': [{'event': label, 'time': deadline, 'late': late}
+                             for label, deadline, late in self.lateness],
+                'bytes_per_second': self.bytes_per_second,
+            }, f, indent=1)
+
+
+metrics = show_metrics()
+
+
+def writeTerminal(pieces):
+    # One system call for everything drawn in a tick, past the text
+    # layer of sys.stdout
+    fd = sys.stdout.fileno()
+    if not hasattr(os, 'writev'):
+        writeAll(fd, b''.join(pieces))
+        return
+    written = os.writev(fd, pieces)
+    if written < sum(map(len, pieces)):
+        writeAll(fd, b''.join(pieces)[written:])
+
+
+class terminal_writer:
+    '''
+    The only place writing to the terminal, it owns the screen buffer and
+    the lyrics cursor. Drawing functions append commands, tick() applies
+    everything queued since the last tick and sends the result to `sink`
+    with one call, as a list of bytes. Escape sequences and the frame
+    come encoded beforehand, only the rendered cells are encoded per tick
+    '''
+    def __init__(self):
+        self.commands = collections.deque()
+        self.sink = writeTerminal
+        self.cursor_x = 1
+        self.cursor_y = 1
+        self.is_end = False
+        # While seeking commands are only applied to the screen buffer
+        self.seeking = False
+        self.held = []
+
+    def tick(self):
+        if not self.commands:
+            return
+        start = time.monotonic()
+        now = show_clock()
+        out = []
+        while self.commands:
+            queued, cmd = self.commands.popleft()
+            metrics.waited(now - queued)
+            if not self.is_end:
+                self.apply(cmd, out)
+        if self.seeking:
+            self.held += out
+            return
+        out.append(screen.render(self.cursor_x, self.cursor_y).encode())
+        self.send(out)
+        metrics.writer_busy += time.monotonic() - start
+
+    def apply(self, cmd, out):
+        op = cmd[0]
+        if op == 'print':
+            str, newline = cmd[1], cmd[2]
+            screen.write(self.cursor_x, self.cursor_y, str)
+            if(newline):
+                self.cursor_x = 1
+                self.cursor_y = self.cursor_y + 1
+            else:
+                self.cursor_x = self.cursor_x + len(str.replace('\0', ''))
+        elif op == 'write':
+            screen.write(cmd[1], cmd[2], cmd[3])
+        elif op == 'move':
+            self.cursor_x = cmd[1]
+            self.cursor_y = cmd[2]
+        elif op == 'paint':
+            if not self.seeking:
+                out.append(screen.render().encode())
+            screen.paint(cmd[1], cmd[3], cmd[4])
+            out.append(cmd[2])
+        elif op == 'scroll':
+            if self.seeking:
+                # Nothing of the panel is shown yet, only the wanted
+                # cells move and the real cursor stays where it is
+                cursor = screen.term_x, screen.term_y
+                screen.scroll(cmd[1], cmd[2], cmd[3], cmd[4])
+                screen.term_x, screen.term_y = cursor
+                return
+            out.append(screen.render().encode())
+            out.append(screen.scroll(cmd[1], cmd[2], cmd[3], cmd[4]).encode())
+        elif op == 'raw':
+            # Escape sequences must not overtake cells drawn before them
+            if not self.seeking:
+                out.append(screen.render().encode())
+            out.append(cmd[1])
+        elif op == 'end':
+            self.is_end = True
+
+
+    def reveal(self):
+        # Stop seeking and paint what was drawn meanwhile in one pass
+        self.seeking = False
+        screen.pending = screen.pending.replace('\0', '')
+        out = self.held + [screen.render(self.cursor_x, self.cursor_y).encode()]
+        self.held = []
+        self.send(out)
+
+    def send(self, out):
+        out = [piece for piece in out if piece]
+        if out:
+            self.sink(out)
+            metrics.wrote(sum(map(len, out)))
+
+
+def output(*cmd):
+    writer.commands.append((show_clock(), cmd))
+
+
+def sync():
+    # Write everything queued so far
+    writer.tick()
+
+
+def move(x, y):
+    output('move', x, y)
+
+
+# print at the cursor and move it. Use this for convenience
 
 
 def _print(str, newline=True):
-    global cursor_x, cursor_y
-    global print_lock
-    print_lock.acquire()
-    if(newline):
-        print(str)
-        cursor_x = 1
-        cursor_y = cursor_y + 1
-    else:
-        print(str, end='')
-        cursor_x = cursor_x + len(str)
-    print_lock.release()
+    output('print', str, newline)
 
 
 class lyric:
+    __slots__ = ('words', 'time', 'interval', 'mode')
+
     def __init__(self, _words, _time, _interval, _mode):
         '''
-        Interval: -1 means to calculate based on last  
+        Time: in 10ms
+        Interval: seconds the event takes, resolved by compileSong()
         Mode:   0: Lyric with new line
                 1: Lyric without new line
                 2: ASCII art
@@ -165,604 +756,959 @@ class lyric:
 ascii_art_width = 40
 ascii_art_height = 20
 
-credits_width = min((term_columns - 4) // 2, 56)
-credits_height = term_lines - ascii_art_height - 2
-
-lyric_width = term_columns - 4 - credits_width
-lyric_height = term_lines - 2
-
-credits_pos_x = lyric_width + 4
-
-ascii_art_x = lyric_width + 4 + (credits_width - ascii_art_width) // 2
-ascii_art_y = credits_height + 3
-
-a1 = ["              .,-:;//;:=,               ",
-      "          . :H@@@MM@M#H/.,+%;,          ",
-      "       ,/X+ +M@@M@MM%=,-%HMMM@X/,       ",
-      "     -+@MM; #M@@MH+-,;XMMMM@MMMM@+-     ",
-      "    ;@M@@M- XM@X;. -+XXXXXHHH@M@M#@/.   ",
-      "  ,%MM@@MH ,@%=            .---=-=:=,.  ",
-      "  =@#@@@MX .,              -%HX##%%%+;  ",
-      " =-./@M@M$                  .;@MMMM@MM: ",
-      " X@/ -#MM/                    .+MM@@@M$ ",
-      ",@M@H: :@:                    . =X#@@@@-",
-      ",@@@MMX, .                    /H- ;@M@M=",
-      ".H@@@@M@+,                    %MM+..%#$.",
-      " /MMMM@MMH/.                  XM@MH; =; ",
-      "  /%+%#XHH@$=              , .H@@@@MX,  ",
-      "   .=--------.           -%H.,@@@@@MX,  ",
-      "   .%MM@@@HHHXX###%+= .:#MMX =M@@MM%.   ",
-      "     =XMMM@MM@MM#H;,-+HMM@M+ /MMMX=     ",
-      "       =%@M@M#@$-.=#@MM@@@M; %M%=       ",
-      "         ,:+$+-,/H#MMMMMMM@= =,         ",
-      "               =++%%%%+/:-.             "]
-
-a2 = ["             =+$HM####@H%;,             ",
-      "          /H###############M$,          ",
-      "          ,@################+           ",
-      "           .H##############+            ",
-      "             X############/             ",
-      "              $##########/              ",
-      "               %########/               ",
-      "                /X/;;+X/                ",
-      "                 -XHHX-                 ",
-      "                ,######,                ",
-      "#############X  .M####M.  X#############",
-      "##############-   -//-   -##############",
-      "X##############%,      ,+##############X",
-      "-##############X        X##############-",
-      " %############%          %############% ",
-      "  %##########;            ;##########%  ",
-      "   ;#######M=              =M#######;   ",
-      "    .+M###@,                ,@###M+.    ",
-      "       :XH.                  .HX:       ",
-      "                                        "]
-
-a3 = ["                 =/;;/-                 ",
-      "                +:    //                ",
-      "               /;      /;               ",
-      "              -X        H.              ",
-      ".//;;;:;;-,   X=        :+   .-;:=;:;%;.",
-      "M-       ,=;;;#:,      ,:#;;:=,       ,@",
-      ":%           :%.=/++++/=.$=           %=",
-      " ,%;         %/:+/;,,/++:+/         ;+. ",
-      "   ,+/.    ,;@+,        ,%H;,    ,/+,   ",
-      "      ;+;;/= @.  .H##X   -X :///+;      ",
-      "      ;+=;;;.@,  .XM@$.  =X.//;=%/.     ",
-      "   ,;:      :@%=        =$H:     .+%-   ",
-      " ,%=         %;-///==///-//         =%, ",
-      ";+           :%-;;;:;;;;-X-           +:",
-      "@-      .-;;;;M-        =M/;;;-.      -X",
-      " :;;::;;-.    %-        :+    ,-;;-;:== ",
-      "              ,X        H.              ",
-      "               ;/      %=               ",
-      "                //    +;                ",
-      "                 ,////,                 "]
-
-a4 = ["                          .,---.        ",
-      "                        ,/XM#MMMX;,     ",
-      "                      -%##########M%,   ",
-      "                     -@######%  $###@=  ",
-      "      .,--,         -H#######$   $###M: ",
-      "   ,;$M###MMX;     .;##########$;HM###X=",
-      " ,/@##########H=      ;################+",
-      "-+#############M/,      %##############+",
-      "%M###############=      /##############:",
-      "H################      .M#############;.",
-      "@###############M      ,@###########M:. ",
-      "X################,      -$=X#######@:   ",
-      "/@##################%-     +######$-    ",
-      ".;##################X     .X#####+,     ",
-      " .;H################/     -X####+.      ",
-      "   ,;X##############,       .MM/        ",
-      "      ,:+$H@M#######M#$-    .$$=        ",
-      "           .,-=;+$@###X:    ;/=.        ",
-      "                  .,/X$;   .::,         ",
-      "                      .,    ..          "]
-
-a5 = ["            .+                          ",
-      "             /M;                        ",
-      "              H#@:              ;,      ",
-      "              -###H-          -@/       ",
-      "               %####$.  -;  .%#X        ",
-      "                M#####+;#H :M#M.        ",
-      "..          .+/;%#########X###-         ",
-      " -/%H%+;-,    +##############/          ",
-      "    .:$M###MH$%+############X  ,--=;-   ",
-      "        -/H#####################H+=.    ",
-      "           .+#################X.        ",
-      "         =%M####################H;.     ",
-      "            /@###############+;;/%%;,   ",
-      "         -%###################$.        ",
-      "       ;H######################M=       ",
-      "    ,%#####MH$%;+#####M###-/@####%      ",
-      "  :$H%+;=-      -####X.,H#   -+M##@-    ",
-      " .              ,###;    ;      =$##+   ",
-      "                .#H,               :XH, ",
-      "                 +                   .;-"]
-
-a6 = ["                     -$-                ",
-      "                    .H##H,              ",
-      "                   +######+             ",
-      "                .+#########H.           ",
-      "              -$############@.          ",
-      "            =H###############@  -X:     ",
-      "          .$##################:  @#@-   ",
-      "     ,;  .M###################;  H###;  ",
-      "   ;@#:  @###################@  ,#####: ",
-      " -M###.  M#################@.  ;######H ",
-      " M####-  +###############$   =@#######X ",
-      " H####$   -M###########+   :#########M, ",
-      "  /####X-   =########%   :M########@/.  ",
-      "    ,;%H@X;   .$###X   :##MM@%+;:-      ",
-      "                 ..                     ",
-      "  -/;:-,.              ,,-==+M########H ",
-      " -##################@HX%%+%%$%%%+:,,    ",
-      "   .-/H%%%+%%$H@###############M@+=:/+: ",
-      "/XHX%:#####MH%=    ,---:;;;;/%%XHM,:###$",
-      "$@#MX %+;-                           .  "]
-
-a7 = ["                                     :X-",
-      "                                  :X### ",
-      "                                ;@####@ ",
-      "                              ;M######X ",
-      "                            -@########$ ",
-      "                          .$##########@ ",
-      "                         =M############-",
-      "                        +##############$",
-      "                      .H############$=. ",
-      "         ,/:         ,M##########M;.    ",
-      "      -+@###;       =##########M;       ",
-      "   =%M#######;     :#########M/         ",
-      "-$M###########;   :#########/           ",
-      " ,;X###########; =########$.            ",
-      "     ;H#########+#######M=              ",
-      "       ,+##############+                ",
-      "          /M#########@-                 ",
-      "            ;M######%                   ",
-      "              +####:                    ",
-      "               ,$M-                     "]
-
-a8 = ["           .-;+$XHHHHHHX$+;-.           ",
-      "        ,;X@@X%/;=----=:/%X@@X/,        ",
-      "      =$@@%=.              .=+H@X:      ",
-      "    -XMX:                      =XMX=    ",
-      "   /@@:                          =H@+   ",
-      "  %@X,                            .$@$  ",
-      " +@X.                               $@% ",
-      "-@@,                                .@@=",
-      "%@%                                  +@$",
-      "H@:                                  :@H",
-      "H@:         :HHHHHHHHHHHHHHHHHHX,    =@H",
-      "%@%         ;@M@@@@@@@@@@@@@@@@@H-   +@$",
-      "=@@,        :@@@@@@@@@@@@@@@@@@@@@= .@@:",
-      " +@X        :@@@@@@@@@@@@@@@M@@@@@@:%@% ",
-      "  $@$,      ;@@@@@@@@@@@@@@@@@M@@@@@@$. ",
-      "   +@@HHHHHHH@@@@@@@@@@@@@@@@@@@@@@@+   ",
-      "    =X@@@@@@@@@@@@@@@@@@@@@@@@@@@@X=    ",
-      "      :$@@@@@@@@@@@@@@@@@@@M@@@@$:      ",
-      "        ,;$@@@@@@@@@@@@@@@@@@X/-        ",
-      "           .-;+$XXHHHHHX$+;-.           "]
-
-a9 = ["            ,:/+/-                      ",
-      "            /M/              .,-=;//;-  ",
-      "       .:/= ;MH/,    ,=/+%$XH@MM#@:     ",
-      "      -$##@+$###@H@MMM#######H:.    -/H#",
-      " .,H@H@ X######@ -H#####@+-     -+H###@ ",
-      "  .,@##H;      +XM##M/,     =%@###@X;-  ",
-      "X%-  :M##########$.    .:%M###@%:       ",
-      "M##H,   +H@@@$/-.  ,;$M###@%,          -",
-      "M####M=,,---,.-%%H####M$:          ,+@##",
-      "@##################@/.         :%H##@$- ",
-      "M###############H,         ;HM##M$=     ",
-      "#################.    .=$M##M$=         ",
-      "################H..;XM##M$=          .:+",
-      "M###################@%=           =+@MH%",
-      "@################M/.          =+H#X%=   ",
-      "=+M##############M,       -/X#X+;.      ",
-      "  .;XM##########H=    ,/X#H+:,          ",
-      "     .=+HM######M+/+HM@+=.              ",
-      "         ,:/%XM####H/.                  ",
-      "              ,.:=-.                    "]
-
-a10 = ["       #+ @      # #              M#@   ",
-       " .    .X  X.%##@;# #   +@#######X. @#%  ",
-       "   ,==.   ,######M+  -#####%M####M-    #",
-       "  :H##M%:=##+ .M##M,;#####/+#######% ,M#",
-       " .M########=  =@#@.=#####M=M#######=  X#",
-       " :@@MMM##M.  -##M.,#######M#######. =  M",
-       "             @##..###:.    .H####. @@ X,",
-       "   ############: ###,/####;  /##= @#. M ",
-       "           ,M## ;##,@#M;/M#M  @# X#% X# ",
-       ".%=   ######M## ##.M#:   ./#M ,M #M ,#$ ",
-       "##/         $## #+;#: #### ;#/ M M- @# :",
-       "#+ #M@MM###M-;M #:$#-##$H# .#X @ + $#. #",
-       "      ######/.: #%=# M#:MM./#.-#  @#: H#",
-       "+,.=   @###: /@ %#,@  ##@X #,-#@.##% .@#",
-       "#####+;/##/ @##  @#,+       /#M    . X, ",
-       "   ;###M#@ M###H .#M-     ,##M  ;@@; ###",
-       "   .M#M##H ;####X ,@#######M/ -M###$  -H",
-       "    .M###%  X####H  .@@MM@;  ;@#M@      ",
-       "      H#M    /@####/      ,++.  / ==-,  ",
-       "               ,=/:, .+X@MMH@#H  #####$="]
-
-ascii_art = [a1, a2, a3, a4, a5, a6, a7, a8, a9, a10]
-
-# Timestamps are adjusted according to actual situations...
-# For Informer213 running at 19200bps, refreshing a ASCII art pattern
-# takes ~600ms, so we add 700ms between every pattern and the next line
-
-lyrics = [
-    ##########  Page 1  ##########
-    lyric("Forms FORM-29827281-12:",            0,      -1,   0),
-    lyric("Test Assessment Report",             200,    -1,   0),
-    lyric("\00\00\00\00\00\00\00",              400,    - \
-          1,   0),  # Keep flushing the buffer
-    lyric("",                                   710,    0,    4),  # Music start
-    lyric("This was a triumph.",                730,    2,    0),
-    lyric("",                                   930,    0,    5),  # Credits start
-    lyric("I'm making a note here:",            1123,   2,    0),
-    lyric("HUGE SUCCESS.",                      1347,   1.7,  0),
-    lyric("It's hard to overstate",             1627,   -1,   0),
-    lyric("my satisfaction.",                   1873,   2.6,  0),
-    lyric("Aperture Science",                   2350,   1.8,  0),
-    lyric(0,                                    2350,   0,    2),  # ASCII 1
-    lyric("We do what we must",                 2733,   1.6,  0),
-    lyric("because we can.",                    2910,   1.5,  0),
-    lyric("For the good of all of us.",         3237,   -1,   0),
-    lyric(1,                                    3500,   0,    2),  # ASCII 2
-    lyric("Except the ones who are dead.",      3567,   -1,   0),
-    lyric("",                                   3717,   0.05, 0),
-    lyric(0,                                    3717,   0,    2),  # ASCII 1
-    lyric("But there's no sense crying",        3787,   -1,   0),
-    lyric("over every mistake.",                3973,   1.77, 0),
-    lyric("You just keep on trying",            4170,   -1,   0),
-    lyric("till you run out of cake.",          4370,   -1,   0),
-    lyric(2,                                    4500,   0,    2),  # ASCII 3
-    lyric("And the Science gets done.",         4570,   -1,   0),
-    lyric("And you make a neat gun.",           4767,   -1,   0),
-    lyric(0,                                    4903,   0,    2),  # ASCII 1
-    lyric("For the people who are",             4973,   -1,   0),
-    lyric("still alive.",                       5110,   1.6,  1),
-
-    ##########  Page 2  ##########
-    lyric(0,                                    5353,
-          0,    3),  # Clear lyrics
-    lyric("Forms FORM-55551-5:",                5413,   -1,   0),
-    lyric("Personnel File Addendum:",           5477,   1.13, 0),
-    lyric("",                                   5650,   0.05, 0),
-    lyric("Dear <<Subject Name Here>>,",        5650,   -1,   0),
-    lyric("",                                   5900,   -1,   0),
-    lyric("I'm not even angry.",                5900,   1.86, 0),
-    lyric("I'm being ",                         6320,   -1,   1),
-    lyric("so ",                                6413,   -1,   1),
-    lyric("sincere right now.",                 6470,   1.9,  0),
-    lyric("Even though you broke ",             6827,   -1,   1),
-    lyric(3,                                    7020,   0,    2),  # ASCII 4
-    lyric("my heart.",                          7090,   -1,   0),
-    lyric("And killed me.",                     7170,   1.43, 0),
-    lyric(4,                                    7300,   0,    2),  # ASCII 5
-    lyric("And tore me to pieces.",             7500,   1.83, 0),
-    lyric("And threw every piece ",             7900,   -1,   1),
-    lyric("into a fire.",                       8080,   1.8,  0),
-    lyric(5,                                    8080,   0,    2),  # ASCII 6
-    lyric("As they burned it hurt because",     8430,   -1,   0),
-    lyric(6,                                    8690,   0,    2),  # ASCII 7
-    lyric("I was so happy for you!",            8760,   1.67, 0),
-    lyric("Now, these points of data",          8960,   -1,   0),
-    lyric("make a beautiful line.",             9167,   -1,   0),
-    lyric("And we're out of beta.",             9357,   -1,   0),
-    lyric("We're releasing on time.",           9560,   -1,   0),
-    lyric(4,                                    9700,   0,    2),  # ASCII 5
-    lyric("So I'm GLaD I got burned.",          9770,   -1,   0),
-    lyric(2,                                    9913,   0,    2),  # ASCII 3
-    lyric("Think of all the things we learned", 9983,   -1,   0),
-    lyric(0,                                    10120,  0,    2),  # ASCII 1
-    lyric("For the people who are",             10190,  -1,   0),
-    lyric("Still alive.",                       10327,  1.8,  0),
-
-    ##########  Page 3  ##########
-    lyric(0,                                    10603,
-          0,    3),  # Clear lyrics
-    lyric("Forms FORM-55551-6:",                10663,  -1,   0),
-    lyric("Personnel File Addendum Addendum:",  10710,  1.36, 0),
-    lyric("",                                   10710,  0.05, 0),
-    lyric("One last thing:",                    10910,  -1,   0),
-    lyric("",                                   11130,  0.05, 0),
-    lyric("Go ahead and leave ",                11130,  -1,   1),
-    lyric("me.",                                11280,  0.5,  0),
-    lyric("I think I'd prefer to stay ",        11507,  -1,   1),
-    lyric("inside.",                            11787,  1.13, 0),
-    lyric("Maybe you'll find someone else",     12037,  -1,   0),
-    lyric("To help you.",                       12390,  1.23, 0),
-    lyric("Maybe Black ",                       12737,  -1,   1),
-    lyric(7,                                    12787,  0,    2),  # ASCII 8
-    lyric("Mesa...",                            12857,  2.7,  0),
-    lyric("THAT WAS A JOKE.",                   13137,  1.46, 1),
-    lyric(" FAT CHANCE.",                       13387,  1.1,  0),
-    lyric("Anyway, ",                           13620,  -1,   1),
-    lyric(8,                                    13670,  0,    2),  # ASCII 9
-    lyric("this cake is great.",                13740,  -1,   0),
-    lyric("It's so delicious and moist.",       13963,  -1,   0),
-    lyric(9,                                    14123,  0,    2),  # ASCII 10
-    lyric("Look at me still talking",           14193,  -1,   0),
-    lyric(1,                                    14320,  0,    2),  # ASCII 2
-    lyric("when there's science to do.",        14390,  -1,  0),
-    lyric(0,                                    14527,  0,    2),  # ASCII 1
-    lyric("When I look out there,",             14597,  -1,   0),
-    lyric("It makes me GLaD I'm not you.",      14767,  -1,   0),
-    lyric(2,                                    14913,  0,    2),  # ASCII 3
-    lyric("I've experiments to run.",           14983,  -1,   0),
-    lyric(4,                                    15120,  0,    2),  # ASCII 5
-    lyric("There is research to be done.",      15190,  -1,   0),
-    lyric(0,                                    15320,  0,    2),  # ASCII 1
-    lyric("On the people who are",              15390,  -1,   0),
-    lyric("still alive",                        15553,  2.0,  1),
-
-    ##########  Page 4  ##########
-    lyric(0,                                    15697,
-          0,    3),  # Clear lyrics
-    lyric("",                                   15757,  0.05, 0),
-    lyric("",                                   15757,  0.05, 0),
-    lyric("",                                   15757,  0.05, 0),
-    lyric("PS: And believe me I am",            15757,  -1,   0),
-    lyric("still alive.",                       15960,  1.13, 0),
-    lyric("PPS: I'm doing Science and I'm",     16150,  -1,   0),
-    lyric("still alive.",                       16363,  1.13, 0),
-    lyric("PPPS: I feel FANTASTIC and I'm",     16550,  -1,   0),
-    lyric("still alive.",                       16760,  -1,   0),
-    lyric("",                                   16860,  -1,   0),
-    lyric("FINAL THOUGH:",                      16860,  -1,   0),
-    lyric("While you're dying I'll be",         16993,  -1,   0),
-    lyric("still alive.",                       17157,  -1,   0),
-    lyric("",                                   17277,  -1,   0),
-    lyric("FINAL THOUGH PS:",                   17277,  -1,   0),
-    lyric("And when you're dead I will be",     17367,  -1,   0),
-    lyric("still alive.",                       17550,  1.13, 0),
-    lyric("",                                   17550,  -1,   0),
-    lyric("",                                   17550,  0.05, 0),
-    lyric("STILL ALIVE",                        17760,  1.13, 0),
-    lyric(0,                                    17900,
-          0,    3),  # Clear lyrics
-    lyric(0,                                    18500,
-          0,    3),  # Clear lyrics
-    lyric("ENDENDENDENDENDENDENDEND",           18500,  0.05, 9)]
-
-credits = r""">LIST PERSONNEL
-            
-Gautam Babbar
-Ted Backman
-Kelly Bailey
-Jeff Ballinger
-Aaron Barber
-Jeep Barnett
-Jeremy Bennett
-Dan Berger
-Yahn Bernier
-Ken Birdwell
-Derrick BirumMike Blaszczak
-Iestyn Bleasdale-Shepherd
-Chris Bokitch
-Steve Bond
-Matt Boone
-Antoine Bourdon
-Jamaal Bradley
-Jason Brashill
-Charlie Brown
-Charlie Burgin
-Andrew Burke
-Augusta Butlin
-Julie Caldwell
-Dario Casali
-Chris Chin
-Jess Cliffe
-Phil Co
-John Cook
-Christen Coomer
-Greg Coomer
-Scott Dalton
-Kerry Davis
-Jason Deakins
-Joe Demers
-Ariel Diaz
-Quintin Doroquez
-Jim Dose
-Chris Douglass
-Laura Dubuk
-Mike Dunkle
-Mike Durand
-Mike Dussault
-Dhabih Eng
-Katie Engel
-Chet Faliszek
-Adrian Finol
-Bill Fletcher
-Moby Francke
-Stephane Gaudette
-Kathy Gehrig
-Vitaliy Genkin
-Paul Graham
-Chris Green
-Chris Grinstead
-John Guthrie
-Aaron Halifax
-Reagan Halifax
-Leslie Hall
-Jeff Hameluck
-Joe Han
-Don Holden
-Jason Holtman
-Gray Horsfield
-Keith Huggins
-Jim Hughes
-Jon Huisingh
-Brian Jacobson
-Lars Jensvold
-Erik Johnson
-Jakob Jungels
-Rich Kaethler
-Steve Kalning
-Aaron Kearly
-Iikka Keranen
-David Kircher
-Eric Kirchmer
-Scott Klintworth
-Alden Kroll
-Marc Laidlaw
-Jeff Lane
-Tim Larkin
-Dan LeFree
-Isabelle LeMay
-Tom Leonard
-Jeff Lind
-Doug Lombardi
-Bianca Loomis
-Richard Lord
-Realm Lovejoy
-Randy Lundeen
-Scott Lynch
-Ido Magal
-Nick Maggiore
-John McCaskey
-Patrick McClard
-Steve McClure
-Hamish McKenzie
-Gary McTaggart
-Jason Mitchell
-Mike Morasky
-John Morello II
-Bryn Moslow
-Arsenio Navarro
-Gabe Newell
-Milton Ngan
-Jake Nicholson
-Martin Otten
-Nick Papineau
-Karen Prell
-Bay Raitt
-Tristan Reidford
-Alfred Reynolds
-Matt Rhoten
-Garret Rickey
-Dave Riller
-Elan Ruskin
-Matthew Russell
-Jason Ruymen
-David Sawyer
-Marc Scaparro
-Wade Schin
-Matthew Scott
-Aaron Seeler
-Jennifer Seeley
-Taylor Sherman
-Eric Smith
-Jeff Sorensen
-David Speyrer
-Jay Stelly
-Jeremy Stone
-Eric Strand
-Kim Swift
-Kelly Thornton
-Eric Twelker
-Carl Uhlman
-Doug Valente
-Bill Van Buren
-Gabe Van Engel
-Alex Vlachos
-Robin Walker
-Joshua Weier
-Andrea Wicklund
-Greg Winkler
-Erik Wolpaw
-Doug Wood
-Matt T. Wood
-Danika Wright
-Matt Wright
-Shawn Zabecki
-Torsten Zabka 
-            
-            
-'Still Alive' by:
-Jonathan Coulton
-            
-Voices:
-Ellen McLain - GlaDOS, Turrets
-Mike Patton - THE ANGER SPHERE
-            
-Voice Casting:
-Shana Landsburg\Teri Fiddleman
-            
-Voice Recording:
-Pure Audio, Seattle, WA
-            
-Voice recording
-scheduling and logistics:
-Pat Cockburn, Pure Audio
-            
-Translations:
-SDL
-            
-Crack Legal Team:
-Liam Lavery
-Karl Quackenbush
-Kristen Boraas
-Kevin Rosenfield
-Alan Bruggeman
-Dennis Tessier
-            
-Thanks for the use of their face:
-Alesia Glidewell - Chell
-            
-Special thanks to everyone at:
-Alienware
-ATI
-Dell
-Falcon Northwest
-Havok
-SOFTIMAGE
-and Don Kemmis, SLK Technologies
-            
-            
-THANK YOU FOR PARTICIPATING
-IN THIS
-ENRICHMENT CENTER ACTIVITY!!"""
-
-
-def drawAA(x, y, ch):
-    for dy in range(ascii_art_height):
-        move(x, y + dy)
-        print(ascii_art[ch][dy], end='')
-        sys.stdout.flush()
-        time.sleep(0.01)
+
+# Layouts are cached on disk for every (TERM, capabilities, columns,
+# lines), bump the version whenever computeLayout() changes
+layout_version = 2
+layout_cache_path = cache_dir / 'still_alive_layout.json'
+# Only the newest layouts are kept, --serve may see many sizes
+layout_cache_size = 64
+
+
+def computeLayout(columns, lines):
+    '''
+    Positions and sizes of the lyrics, credits and ASCII art, the frame
+    rows, the bytes painting the frame on a cleared screen and the row
+    blanking the lyrics
+    '''
+    credits_width = min((columns - 4) // 2, 56)
+    credits_height = lines - ascii_art_height - 2
+
+    lyric_width = columns - 4 - credits_width
+    lyric_height = lines - 2
+
+    frame = [' ' + '-' * lyric_width + '  ' + '-' * credits_width + ' ']
+    frame += ['|' + ' ' * lyric_width + '||' + ' ' * credits_width + '|'] * credits_height
+    frame += ['|' + ' ' * lyric_width + '| ' + '-' * credits_width + ' ']
+    frame += ['|' + ' ' * lyric_width + '|'] * (lyric_height - 1 - credits_height)
+    frame += [' ' + '-' * lyric_width + ' ']
+    scratch = screen_buffer(columns, lines)
+    scratch.clear()
+    for y, row in enumerate(frame):
+        scratch.write(1, y + 1, row)
+
+    return {
+        'credits_width': credits_width,
+        'credits_height': credits_height,
+        'lyric_width': lyric_width,
+        'lyric_height': lyric_height,
+        'credits_pos_x': lyric_width + 4,
+        'ascii_art_x': lyric_width + 4 + (credits_width - ascii_art_width) // 2,
+        'ascii_art_y': credits_height + 3,
+        'frame': frame,
+        'frame_paint': scratch.render(2, 2),
+        'blank_row': '|' + ' ' * lyric_width,
+    }
+
+
+def loadLayout(columns, lines):
+    caps = [name for name, on in (('ech', enable_ech), ('el', enable_el),
+                                  ('rep', enable_rep)) if on]
+    key = '%s %dx%d %s' % (term, columns, lines, ','.join(caps))
+    try:
+        cache = json.loads(layout_cache_path.read_text())
+    except (OSError, ValueError):
+        cache = {}
+    if cache.get('version') != layout_version:
+        cache = {'version': layout_version}
+    if key not in cache:
+        cache[key] = computeLayout(columns, lines)
+        while len(cache) > layout_cache_size + 1:
+            del cache[next(k for k in cache if k != 'version')]
+        try:
+            layout_cache_path.parent.mkdir(parents=True, exist_ok=True)
+            temp = layout_cache_path.with_suffix('.%d' % os.getpid())
+            temp.write_text(json.dumps(cache))
+            os.replace(temp, layout_cache_path)
+        except OSError:
+            pass
+    return cache[key]
+
+
+def applyLayout(columns, lines):
+    # Lay out the lyrics, credits and ASCII art for a terminal size
+    global term_columns, term_lines
+    global credits_width, credits_height, lyric_width, lyric_height
+    global credits_pos_x, ascii_art_x, ascii_art_y
+    global frame_rows, frame_paint, blank_row
+    term_columns, term_lines = columns, lines
+
+    layout = loadLayout(columns, lines)
+    credits_width = layout['credits_width']
+    credits_height = layout['credits_height']
+    lyric_width = layout['lyric_width']
+    lyric_height = layout['lyric_height']
+    credits_pos_x = layout['credits_pos_x']
+    ascii_art_x = layout['ascii_art_x']
+    ascii_art_y = layout['ascii_art_y']
+    frame_rows = layout['frame']
+    frame_paint = layout['frame_paint'].encode()
+    blank_row = layout['blank_row']
+
+
+def setupLayout(columns, lines):
+    # Lay out a terminal and start drawing on a blank screen
+    global screen, writer, is_draw_end
+    applyLayout(columns, lines)
+    screen = screen_buffer(term_columns, term_lines)
+    writer = terminal_writer()
+    is_draw_end = False
+
+
+def resizeScreen(columns, lines):
+    '''
+    Lay out a resized terminal while the show goes on. The lyrics, the
+    credits panel and the ASCII art are moved from the old screen buffer
+    to their new places and the shown cells are kept where the terminal
+    keeps them, so rendering only repaints what moved or changed size
+    '''
+    global screen
+    old = screen
+    old_lyric = (lyric_width, lyric_height)
+    old_credits = (credits_pos_x, credits_width, credits_height)
+    old_art = (ascii_art_x, ascii_art_y)
+    applyLayout(columns, lines)
+    screen = screen_buffer(columns, lines)
+    for y in range(min(old.height, lines)):
+        width = min(old.width, columns)
+        screen.shown[y][:width] = old.shown[y][:width]
+    for y, row in enumerate(frame_rows):
+        screen.write(1, y + 1, row)
+
+    def move_block(old_x, old_y, x, y, width, height):
+        for dy in range(height):
+            row = old.cells[old_y - 1 + dy][old_x - 1:old_x - 1 + width]
+            screen.write(x, y + dy, ''.join(row))
+    move_block(2, 2, 2, 2, min(old_lyric[0], lyric_width),
+               min(old_lyric[1], lyric_height))
+    # Credits stay bottom aligned
+    height = min(old_credits[2], credits_height)
+    move_block(old_credits[0], 2 + old_credits[2] - height,
+               credits_pos_x, 2 + credits_height - height,
+               min(old_credits[1], credits_width), height)
+    move_block(old_art[0], old_art[1], ascii_art_x, ascii_art_y,
+               ascii_art_width, ascii_art_height)
+    screen.dirty = set(range(lines))
+
+
+setupLayout(term_columns, term_lines)
+
+
+# A song timeline is a text file in the manner of LRC. "[mm:ss.cc] words"
+# types a lyric line, a "\" at its end keeps the cursor on that line and
+# "\0" sends a NUL. "{seconds}" after the time sets how long typing takes,
+# by default until the next event. "@art N", "@clear", "@music",
+# "@credits" and "@end" are the other events. "[name:value]" tags (music
+# names the sound file) and "#" comments may come anywhere
+song_source = Path(__file__).with_name('still_alive.lrc')
+song_modes = {'@art': 2, '@clear': 3, '@music': 4, '@credits': 5, '@end': 9}
+song_event = re.compile(r'\[(\d+):(\d+(?:\.\d+)?)\] ?(?:\{(\d*\.?\d+)\} ?)?(.*)$')
+song_tag = re.compile(r'\[([a-z]+):(.*)\]$')
+
+
+def songWords(words):
+    # Unescape the words of a lyric line, and tell whether it ends the line
+    out = ''
+    i = 0
+    while i < len(words):
+        if words[i] != '\\':
+            out += words[i]
+        elif i + 1 == len(words):
+            return out, False
+        elif words[i + 1] in '0\\':
+            out += '\0' if words[i + 1] == '0' else '\\'
+            i = i + 1
+        else:
+            raise ValueError('unknown escape "\\%s"' % words[i + 1])
+        i = i + 1
+    return out, True
+
+
+def compileSong(path, arts):
+    '''
+    Read and check a song timeline with `arts` ASCII arts to choose from,
+    and return its tags and its lyric events with every interval
+    resolved. ValueError tells the line of the first mistake
+    '''
+    tags = {}
+    table = []
+    music = False
+    with open(path, encoding='utf-8') as f:
+        for number, text in enumerate(f, 1):
+            text = text.rstrip('\n')
+            try:
+                if not text.strip() or text.startswith('#'):
+                    continue
+                if song_tag.match(text):
+                    name, value = song_tag.match(text).groups()
+                    tags[name] = value.strip()
+                    continue
+                m = song_event.match(text)
+                if not m:
+                    raise ValueError('expected "[mm:ss.cc] words" or "[name:value]"')
+                if table and table[-1].mode == 9:
+                    raise ValueError('events after "@end"')
+                _time = int(m.group(1)) * 6000 + round(float(m.group(2)) * 100)
+                if table and _time < table[-1].time:
+                    raise ValueError('the time goes back')
+                command = m.group(4).split()
+                if command and command[0] in song_modes:
+                    _mode = song_modes[command[0]]
+                    if m.group(3):
+                        raise ValueError('"%s" takes no typing time' % command[0])
+                    _words = ''
+                    if _mode == 2:
+                        if len(command) != 2 or not command[1].isdigit() or \
+                                not 1 <= int(command[1]) <= arts:
+                            raise ValueError('"@art" expects a number from 1 to %d' % arts)
+                        _words = int(command[1]) - 1
+                    elif len(command) > 1:
+                        raise ValueError('"%s" takes no argument' % command[0])
+                    if _mode == 4:
+                        if music:
+                            raise ValueError('the music starts twice')
+                        music = True
+                    if _mode == 5 and not music:
+                        raise ValueError('the credits start before the music')
+                    _interval = 0
+                else:
+                    _words, newline = songWords(m.group(4))
+                    _mode = 0 if newline else 1
+                    _interval = float(m.group(3)) if m.group(3) else -1
+                table.append(lyric(_words, _time, _interval, _mode))
+            except ValueError as e:
+                raise ValueError('%s:%d: %s' % (path, number, e))
+    if not table or table[-1].mode != 9:
+        raise ValueError('%s: the song has no "@end"' % path)
+    # The credits reserve and --start-at count on both
+    for name in ('@music', '@credits'):
+        if not any(l.mode == song_modes[name] for l in table):
+            raise ValueError('%s: the song has no "%s"' % (path, name))
+    for i, l in enumerate(table):
+        if l.interval < 0:
+            l.interval = (table[i + 1].time - l.time) / 100.0
+    return tags, table
+
+
+# still_alive.pak starts with the number of blobs, then for every blob its
+# name, offset and size. ASCII arts are fixed-width rows, lyrics are
+# records pointing into a blob of their words, or holding a number (the
+# ASCII art index) when the length is lyric_number. The song tags are JSON.
+# Bump the magic whenever the format changes, older packs are rebuilt
+asset_magic = b'SAA2'
+asset_header = struct.Struct('<4sH')
+asset_entry = struct.Struct('<16sII')
+lyric_record = struct.Struct('<iIdBH')
+lyric_number = 0xffff
+assets_source = Path(__file__).with_name('still_alive_assets.py')
+assets_path = Path(__file__).with_name('still_alive.pak')
+
+
+def packAssets():
+    '''
+    Build the asset pack from still_alive_assets.py and still_alive.lrc,
+    this is the only time the Python literals and the song are parsed
+    '''
+    sys.path.insert(0, str(assets_source.parent))
+    import still_alive_assets
+    blobs = []
+    for i, art in enumerate(still_alive_assets.ascii_art):
+        blobs.append(('art%d' % i, ''.join(art).encode('ascii')))
+    blobs.append(('credits', still_alive_assets.credits.encode()))
+    tags, table = compileSong(song_source, len(still_alive_assets.ascii_art))
+    words = b''
+    records = b''
+    for l in table:
+        if isinstance(l.words, int):
+            records += lyric_record.pack(l.words, l.time, l.interval, l.mode,
+                                         lyric_number)
+        else:
+            data = l.words.encode()
+            records += lyric_record.pack(len(words), l.time, l.interval,
+                                         l.mode, len(data))
+            words += data
+    blobs.append(('lyrics', records))
+    blobs.append(('words', words))
+    blobs.append(('song', json.dumps(tags).encode()))
+
+    offset = asset_header.size + asset_entry.size * len(blobs)
+    pack = [asset_header.pack(asset_magic, len(blobs))]
+    for name, data in blobs:
+        pack.append(asset_entry.pack(name.encode(), offset, len(data)))
+        offset += len(data)
+    pack += [data for name, data in blobs]
+    return b''.join(pack)
+
+
+class asset_pack:
+    '''
+    The memory-mapped asset pack. Nothing is decoded until asked for, an
+    ASCII art row is a memoryview slice of the map
+    '''
+    def __init__(self):
+        self.view = None
+        if not self.current():
+            data = packAssets()
+            try:
+                # Another process may have the old pack mapped
+                temp = assets_path.with_suffix('.%d' % os.getpid())
+                temp.write_bytes(data)
+                os.replace(temp, assets_path)
+            except OSError:
+                # Read-only install, use the pack from memory
+                self.view = memoryview(data)
+        if self.view is None:
+            with open(assets_path, 'rb') as f:
+                self.view = memoryview(mmap.mmap(f.fileno(), 0,
+                                                 access=mmap.ACCESS_READ))
+        magic, count = asset_header.unpack_from(self.view, 0)
+        self.index = {}
+        for i in range(count):
+            name, offset, size = asset_entry.unpack_from(
+                self.view, asset_header.size + asset_entry.size * i)
+            self.index[name.rstrip(b'\0').decode()] = (offset, size)
+
+    @staticmethod
+    def current():
+        # Packed in this format and newer than the sources
+        try:
+            with open(assets_path, 'rb') as f:
+                magic = f.read(len(asset_magic))
+            return magic == asset_magic and assets_path.stat().st_mtime >= max(
+                assets_source.stat().st_mtime, song_source.stat().st_mtime)
+        except OSError:
+            return False
+
+    def blob(self, name):
+        offset, size = self.index[name]
+        return self.view[offset:offset + size]
+
+    def art(self, i):
+        art = self.blob('art%d' % i)
+        return [art[dy * ascii_art_width:(dy + 1) * ascii_art_width]
+                for dy in range(ascii_art_height)]
+
+    def text(self, name):
+        return str(self.blob(name), 'utf-8')
+
+    def song(self):
+        return json.loads(self.text('song'))
+
+    def lyrics(self):
+        records = self.blob('lyrics')
+        words = self.blob('words')
+        table = []
+        for i in range(len(records) // lyric_record.size):
+            number, _time, _interval, _mode, length = \
+                lyric_record.unpack_from(records, i * lyric_record.size)
+            if length == lyric_number:
+                _words = number
+            else:
+                _words = str(words[number:number + length], 'utf-8')
+            table.append(lyric(_words, _time, _interval, _mode))
+        return table
+
+
+class packed_art:
+    # ascii_art[i][dy] slices an ASCII art out of the pack when first drawn
+    def __init__(self, pack):
+        self.pack = pack
+        self.arts = {}
+
+    def __len__(self):
+        return len([name for name in self.pack.index if name.startswith('art')])
+
+    def __getitem__(self, i):
+        if i not in self.arts:
+            self.arts[i] = self.pack.art(i)
+        return self.arts[i]
+
+
+assets = asset_pack()
+ascii_art = packed_art(assets)
+credits = assets.text('credits')
+if song_path:
+    try:
+        song, lyrics = compileSong(song_path, len(ascii_art))
+    except (OSError, ValueError) as e:
+        print(e)
+        sys.exit(1)
+else:
+    song, lyrics = assets.song(), assets.lyrics()
+music_file = song.get('music', 'sa1.mp3')
+
+# Seconds for the whole credits roll
+credits_duration = 174.0
+
+
+def artSpans(old, new):
+    # Runs of changed cells, a gap shorter than a cursor motion is resent
+    spans = []
+    x = 0
+    while x < len(new):
+        if old[x] == new[x]:
+            x = x + 1
+            continue
+        end = x + 1
+        while end < len(new) and (old[end] != new[end] or
+                                  new[end:end + 4] != old[end:end + 4]):
+            end = end + 1
+        spans.append((x, new[x:end]))
+        x = end
+    return spans
+
+
+class art_transitions:
+    '''
+    art_steps[i] is, for the lyric event i drawing an ASCII art, the rows
+    which differ from the art drawn before it as [(dy, [(dx, text), ...]),
+    ...]. Each transition between two arts is worked out when first asked
+    for, and only once
+    '''
+    def __init__(self):
+        self.keys = {}
+        self.done = {}
+        previous = None
+        for i, l in enumerate(lyrics):
+            if l.mode == 2:
+                self.keys[i] = (previous, l.words)
+                previous = l.words
+
+    def __getitem__(self, i):
+        key = self.keys[i]
+        if key not in self.done:
+            previous, current = key
+            old = [' ' * ascii_art_width] * ascii_art_height \
+                if previous is None else \
+                [row.tobytes().decode('ascii') for row in ascii_art[previous]]
+            new = [row.tobytes().decode('ascii') for row in ascii_art[current]]
+            self.done[key] = [(dy, artSpans(old[dy], new[dy]))
+                              for dy in range(ascii_art_height)
+                              if old[dy] != new[dy]]
+        return self.done[key]
+
+
+art_steps = art_transitions()
+
+
+def artCost(steps, cup):
+    # The real cursor goes back to the lyrics after every row
+    return sum(len(text) + cup for dy, spans in steps for dx, text in spans) \
+        + len(steps) * cup
+
+
+def estimateCost():
+    '''
+    Estimate how many bytes every lyric event sends to the terminal.
+    An ASCII art transition only counts the spans that change
+    '''
+    cup = len('\033[%d;%dH' % (term_lines, term_columns))
+    cost = []
+    typed = 0
+    rows = 0
+    for i, l in enumerate(lyrics):
+        if l.mode <= 1:
+            typed += len(l.words)
+            rows += l.mode == 0
+            cost.append(len(l.words) + cup)
+        elif l.mode == 2:
+            cost.append(artCost(art_steps[i], cup))
+        elif l.mode == 3:
+            cost.append(typed + cup * (rows + 1))
+            typed = 0
+            rows = 0
+        else:
+            cost.append(0)
+    return cost
+
+
+def creditsRate():
+    '''
+    Average bytes per second taken by the credits roll: every character
+    moves the cursor there and back, every new line scrolls or rewrites
+    the panel
+    '''
+    cup = len('\033[%d;%dH' % (term_lines, term_columns))
+    lines = credits.count('\n')
+    if enable_margins:
+        scratch = screen_buffer(term_columns, term_lines)
+        newline = cup + len(scratch.scroll(credits_pos_x, 2,
+                                           credits_pos_x + credits_width - 1,
+                                           credits_height + 1))
+    else:
+        newline = credits_height * (credits_width + cup)
+    size = (len(credits) - lines) * (1 + 2 * cup) + lines * newline
+    return size / credits_duration
+
+
+def planLyrics(baud):
+    '''
+    Resolve the start time (in 10ms) and per character interval of every
+    lyric event. With a baud rate, an event that cannot send its bytes
+    before the next one is due is typed faster or started earlier, so
+    timed events are never late at that line rate. The interval of an
+    ASCII art is the line time of one byte, 0 without a baud rate
+    '''
+    plan = [None] * len(lyrics)
+    plan[-1] = (lyrics[-1].time, 0)
+    if baud:
+        cost = estimateCost()
+        credits_rate = creditsRate()
+        credits_time = min(l.time for l in lyrics if l.mode == 5)
+    for i in range(len(lyrics) - 2, -1, -1):
+        l = lyrics[i]
+        wordCount = max(len(l.words), 1) if l.mode <= 1 else 1
+        total = l.interval * 100
+        start = l.time
+        if baud:
+            rate = baud / 10.0
+            if l.time >= credits_time:
+                rate -= credits_rate
+            if rate <= 0:
+                raise ValueError("%d bps is too slow for the credits" % baud)
+            line = cost[i] / rate * 100
+            deadline = plan[i + 1][0]
+            if l.mode <= 1:
+                total = max(min(total, deadline - start), line)
+            else:
+                # drawAA() reveals an art as fast as the line sends it
+                total = line
+            start = min(start, deadline - total)
+        if l.mode == 2:
+            plan[i] = (start, 1.0 / rate if baud else 0.0)
+        else:
+            plan[i] = (start, total / 100.0 / wordCount)
+    return plan
+
+
+class wave_player:
+    '''
+    Plays a WAV file into a sink (the null device unless told otherwise)
+    from a thread at the pace of its sample rate, and reports how much of
+    it has been played. The position is None once the file has ended
+    '''
+    block = 0.02
+
+    def __init__(self, path, sink=os.devnull):
+        self.wav = wave.open(path, 'rb')
+        self.sink = open(sink, 'wb')
+        self.rate = self.wav.getframerate()
+        self.frame_size = self.wav.getsampwidth() * self.wav.getnchannels()
+        self.frames = 0
+        self.is_end = False
+
+    def start(self, position=0.0):
+        self.frames = min(int(position * self.rate), self.wav.getnframes())
+        self.wav.setpos(self.frames)
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        startTime = time.monotonic() - self.frames / self.rate
+        count = max(1, int(self.rate * self.block))
+        while True:
+            data = self.wav.readframes(count)
+            if not data:
+                break
+            self.sink.write(data)
+            self.frames += len(data) // self.frame_size
+            delay = startTime + self.frames / self.rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        self.is_end = True
+
+    def position(self):
+        if self.is_end:
+            return None
+        return self.frames / self.rate
+
+
+class fake_audio:
+    # Silent audio backend whose position runs at `rate` times real time
+    def __init__(self, rate):
+        self.rate = rate
+        self.startTime = None
+
+    def start(self, position=0.0):
+        self.startTime = time.monotonic() - position / self.rate
+
+    def position(self):
+        return (time.monotonic() - self.startTime) * self.rate
+
+
+class audio_clock:
+    '''
+    Show time slaved to the playback position of an audio backend, which
+    is `start` seconds of show time when the music starts. The show clock
+    keeps running on `clock` and its rate is nudged towards the audio
+    position, so a drift is caught up within about `horizon` seconds
+    instead of making the lyrics jump. Only an error larger than `jump`
+    seconds (a stalled backend) is corrected at once
+    '''
+    slew = 0.05
+    horizon = 1.0
+    jump = 0.5
+
+    def __init__(self, backend, start, clock):
+        self.backend = backend
+        self.start = start
+        self.clock = clock
+        self.base_clock = None
+        self.rate = 1.0
+        self.error = 0.0
+
+    def now(self):
+        t = self.clock()
+        if self.base_clock is None:
+            self.base = self.base_clock = t
+        show = self.base + (t - self.base_clock) * self.rate
+        position = self.backend.position()
+        if position is None:
+            return show
+        error = self.start + position - show
+        self.error = max(self.error, abs(error))
+        if abs(error) > self.jump:
+            show = self.start + position
+            self.rate = 1.0
+        else:
+            self.rate = 1.0 + max(-self.slew, min(self.slew, error / self.horizon))
+        self.base, self.base_clock = show, t
+        return show
+
+
+def tickLength(baud):
+    '''
+    Seconds of drawing gathered into one write: 10ms on a fast terminal,
+    on a serial line the time it takes to send a cursor round trip and
+    a few characters (32 bytes), at most 50ms so typing stays smooth
+    '''
+    if tick_ms:
+        return tick_ms / 1000.0
+    if not baud:
+        return 0.01
+    return min(max(32 * 10.0 / baud, 0.01), 0.05)
+
+
+class timeline_scheduler:
+    '''
+    Runs tasks written as generators. A task yields (deadline, label) with
+    the deadline in seconds since the show started, the scheduler sleeps
+    until the earliest deadline of all tasks and resumes that task.
+    Output is written after each step, or with `tick` set, steps due
+    within `tick` seconds of the last write are written together.
+    Lateness of every labelled deadline is recorded in `lateness`. A
+    virtual scheduler jumps to every deadline without sleeping. Once
+    `audio` is set to an audio_clock the show time follows the music. The
+    show can start at `start_at` seconds: every step due before is run at
+    once with the output kept in the screen buffer, which is then painted
+    in one pass. `speed` scales the real clock. `observer` is called
+    after every step with the index in `lateness` of the event the task
+    is working on, and its deadline
+    '''
+    def __init__(self, virtual=False):
+        self.tasks = []
+        self.count = 0
+        self.lateness = metrics.lateness = []
+        self.current = {}
+        self.observer = None
+        self.virtual = virtual
+        # Neither music nor signals when the show is not for real
+        self.simulated = virtual
+        self.time = 0.0
+        self.music_time = None
+        self.audio = None
+        self.start_at = 0.0
+        self.speed = 1.0
+        self.seeking = False
+        self.tick = 0.0
+        self.flushed = 0.0
+        self.startTime = time.monotonic()
+
+    def clock(self):
+        return self.start_at + (time.monotonic() - self.startTime) * self.speed
+
+    def now(self):
+        if self.virtual or self.seeking:
+            return self.time
+        if self.audio is not None:
+            return self.audio.now()
+        return self.clock()
+
+    def spawn(self, task):
+        self.resume(task)
+
+    def resume(self, task):
+        try:
+            deadline, label = next(task)
+        except StopIteration:
+            return
+        # count keeps tasks with the same deadline in spawn order
+        heapq.heappush(self.tasks, (deadline, self.count, label, task))
+        self.count += 1
+
+    def seek(self):
+        self.seeking = writer.seeking = True
+        while self.tasks and self.tasks[0][0] < self.start_at and \
+                not is_draw_end:
+            deadline, _, label, task = heapq.heappop(self.tasks)
+            self.time = max(self.time, deadline)
+            self.resume(task)
+            writer.tick()
+        self.seeking = False
+        self.time = self.start_at
+        writer.reveal()
+
+    def run(self):
+        if self.start_at:
+            self.seek()
+            self.startTime = time.monotonic()
+        while self.tasks and not is_draw_end:
+            deadline, _, label, task = heapq.heappop(self.tasks)
+            delay = deadline - self.now()
+            if self.virtual and delay > 0:
+                self.time = deadline
+            # The audio clock may run slower than the one sleeping
+            while delay > 0 and not self.virtual:
+                time.sleep(delay / self.speed)
+                delay = deadline - self.now()
+            if label is not None:
+                self.lateness.append((label, deadline, self.now() - deadline))
+                self.current[task] = len(self.lateness) - 1
+            self.resume(task)
+            if not self.tick or not self.tasks or \
+                    self.tasks[0][0] - self.flushed >= self.tick:
+                writer.tick()
+                self.flushed = self.now()
+            if self.observer:
+                self.observer(self.current.get(task), deadline)
+
+    def report(self):
+        if not self.lateness:
+            return
+        late = sorted(self.lateness, key=lambda e: e[2], reverse=True)
+        total = sum(e[2] for e in self.lateness)
+        print("%d timed events, mean lateness %.1fms, max %.1fms" %
+              (len(late), total / len(late) * 1000, late[0][2] * 1000))
+        if self.audio is not None:
+            print("largest drift from the music %.1fms" %
+                  (self.audio.error * 1000))
+        for label, deadline, lateness in late[:5]:
+            print("  %7.2fs  %+7.1fms  %s" % (deadline, lateness * 1000, label))
+
+
+class tty_line:
+    '''
+    The output queue of a tty. ready() waits until what was written has
+    nearly left the port, so drawing goes at the pace bytes really leave
+    it. XON/XOFF flow control is turned on: while the terminal holds the
+    line the queue does not drain and drawing waits
+    '''
+    def __init__(self, fd):
+        import termios
+        import fcntl
+        self.termios, self.fcntl = termios, fcntl
+        self.fd = fd
+        self.saved = termios.tcgetattr(fd)
+        attr = termios.tcgetattr(fd)
+        attr[0] |= termios.IXON
+        termios.tcsetattr(fd, termios.TCSADRAIN, attr)
+        speeds = {getattr(termios, name): int(name[1:])
+                  for name in dir(termios) if re.fullmatch(r'B\d+', name)}
+        # Bytes per second with 10 bits per character
+        self.rate = max(speeds.get(attr[5], 0), 300) / 10.0
+        # Enough to keep the line busy until the next wake up
+        self.low = max(int(self.rate * 0.01), 1)
+
+    def pending(self):
+        queued = self.fcntl.ioctl(self.fd, self.termios.TIOCOUTQ, b'\0' * 4)
+        return struct.unpack('i', queued)[0]
+
+    async def ready(self):
+        while True:
+            queued = self.pending()
+            if queued <= self.low:
+                return
+            await asyncio.sleep((queued - self.low) / self.rate)
+
+    def restore(self):
+        self.termios.tcdrain(self.fd)
+        self.termios.tcsetattr(self.fd, self.termios.TCSADRAIN, self.saved)
+
+
+class virtual_selector (selectors.DefaultSelector):
+    # Polls without waiting, and moves the clock of its loop instead
+    def __init__(self, loop):
+        selectors.DefaultSelector.__init__(self)
+        self.loop = loop
+
+    def select(self, timeout=None):
+        if timeout:
+            self.loop.now += timeout
+        return selectors.DefaultSelector.select(self, 0)
+
+
+class virtual_loop (asyncio.SelectorEventLoop):
+    '''
+    An event loop on a simulated clock in seconds: instead of waiting for
+    its next timer it jumps to it, so coroutines run as fast as the CPU
+    allows and see the times of a real run
+    '''
+    def __init__(self):
+        self.now = 0.0
+        asyncio.SelectorEventLoop.__init__(self, virtual_selector(self))
+
+    def time(self):
+        return self.now
+
+
+class asyncio_scheduler (timeline_scheduler):
+    '''
+    Plays the same tasks on an asyncio event loop: every task becomes a
+    coroutine sleeping until its deadlines, and everything drawn during
+    one tick is written at once: the first drawing after a quiet moment
+    goes out at once, the rest at the end of its tick. With a tty_line
+    as `line` every step also waits for the line to drain. A simulated
+    scheduler plays on a virtual_loop
+    '''
+    def __init__(self, simulated=False):
+        timeline_scheduler.__init__(self)
+        self.simulated = simulated
+        self.loop = None
+        self.flushing = False
+        self.line = None
+        # The first task spawned is the show, the rest end with it
+        self.show = None
+
+    def clock(self):
+        return self.start_at + (self.loop.time() - self.startTime) * self.speed
+
+    def spawn(self, task):
+        if self.show is None:
+            self.show = task
+        # Until the loop plays them, tasks wait in the heap
+        if self.loop is None or self.seeking:
+            timeline_scheduler.spawn(self, task)
+        else:
+            self.loop.create_task(self.play(task))
+
+    async def play(self, task, step=None):
+        if step is not None:
+            task = itertools.chain([step], task)
+        for deadline, label in task:
+            self.flush()
+            delay = deadline - self.now()
+            while delay > 0:
+                await asyncio.sleep(delay / self.speed)
+                delay = deadline - self.now()
+            if self.line is not None:
+                await self.line.ready()
+            if label is not None:
+                self.lateness.append((label, deadline, self.now() - deadline))
+        self.flush()
+
+    def flush(self):
+        if not self.flushing:
+            self.flushing = True
+            delay = self.flushed + self.tick - self.loop.time()
+            self.loop.call_later(max(delay, 0), self.write)
+
+    def write(self):
+        self.flushing = False
+        self.flushed = self.loop.time()
+        writer.tick()
+
+    def resize(self):
+        try:
+            columns, lines = os.get_terminal_size(sys.stdout.fileno())
+        except OSError:
+            return
+        if (columns, lines) == (term_columns, term_lines) or \
+                columns < 80 or lines < 24:
+            return
+        # Queued writes hold positions in the old layout
+        writer.tick()
+        resizeScreen(columns, lines)
+        self.flush()
+
+    async def main(self):
+        self.loop = asyncio.get_running_loop()
+        if self.start_at:
+            self.seek()
+        self.startTime = self.loop.time()
+        if hasattr(signal, 'SIGWINCH') and sys.stdout.isatty() and \
+                not self.simulated:
+            self.loop.add_signal_handler(signal.SIGWINCH, self.resize)
+        # Seeking resumes tasks in any order, the show is known by its
+        # generator
+        waiting = sorted(self.tasks, key=lambda entry: entry[1])
+        self.tasks = []
+        tasks = {task: self.loop.create_task(self.play(task, (deadline, label)))
+                 for deadline, _, label, task in waiting}
+        try:
+            if not is_draw_end and self.show in tasks:
+                await tasks[self.show]
+            for task in asyncio.all_tasks() - {asyncio.current_task()}:
+                task.cancel()
+        finally:
+            # Also when Ctrl-C exits through the loop
+            if self.line is not None:
+                self.line.restore()
+
+    def run(self):
+        if not self.simulated:
+            asyncio.run(self.main())
+            return
+        loop = virtual_loop()
+        try:
+            loop.run_until_complete(self.main())
+        finally:
+            loop.close()
+
+
+def drawAA(steps, startTime, interval):
+    '''
+    Draw the changed spans of an ASCII art transition. Without a line
+    rate (interval 0) a changed row is revealed every 10ms. Otherwise
+    each row is due once the line has sent the ones before it, at
+    `interval` seconds per byte, and rows due within 10ms are drawn
+    at once
+    '''
+    cup = len('\033[%d;%dH' % (term_lines, term_columns))
+    sent = 0
+    last = None
+    for k, (dy, spans) in enumerate(steps):
+        if interval:
+            deadline = startTime + sent * interval
+        else:
+            deadline = startTime + k * 0.01
+        if last is None or deadline >= last + 0.01:
+            yield deadline, None
+            last = deadline
+        # The position is read every row, the terminal may be resized
+        for dx, text in spans:
+            output('write', ascii_art_x + dx, ascii_art_y + dy, text)
+        sent += artCost([(dy, spans)], cup)
 
 
 def drawFrame():
-    move(1, 1)
-    _print(' ' + '-' * lyric_width + '  ' + '-' * credits_width + ' ', not is_vt)
-    for _ in range(credits_height):
-        _print('|' + ' ' * lyric_width + '||' + ' ' * credits_width + '|', not is_vt)
-    _print('|' + ' ' * lyric_width + '| ' + '-' * credits_width + ' ', not is_vt)
-    for _ in range(lyric_height - 1 - credits_height):
-        _print('|' + ' ' * lyric_width + '|')
-    _print(' ' + '-' * lyric_width + ' ', False)
+    # Clears the screen too, the bytes come ready from the layout cache
+    output('paint', frame_rows, frame_paint, 2, 2)
     move(2, 2)
-    sys.stdout.flush()
-    time.sleep(1)
 
 
 def clearLyrics():
     move(1, 2)
     for _ in range(lyric_height):
-        _print('|' + ' ' * lyric_width)
+        _print(blank_row)
     move(2, 2)
 
 
-def drawLyrics(str, x, y, interval, newline):
+def drawLyrics(str, x, y, startTime, interval, newline):
+    # Every character is paced against the start of the line, so sleep
+    # overshoot does not build up over the line
     move(x + 2, y + 2)
-    for ch in str:
+    for k, ch in enumerate(str):
+        yield startTime + k * interval, None
         _print(ch, False)
-        sys.stdout.flush()
-        time.sleep(interval)
         x = x + 1
     if(newline):
         x = 0
@@ -771,109 +1717,614 @@ def drawLyrics(str, x, y, interval, newline):
     return x
 
 
-class thread_credits (threading.Thread):
-    def run(self):
-        global print_lock
-        global cursor_x, cursor_y
-        credit_x = 0
-        i = 0
-        length = len(credits)
-        last_credits = [""]
-        startTime = time.time()
-        for ch in credits:
-            currentTime = startTime + 174.0 / length * i
-            i += 1
-            if ch == '\n':
-                credit_x = 0
-                last_credits.append("")
-                if len(last_credits) > credits_height:
-                    last_credits = last_credits[-credits_height:]
-                print_lock.acquire()
-                if is_draw_end:
-                    print_lock.release()
-                    break
-                for y in range(2, 2 + credits_height - len(last_credits)):
-                    move(credits_pos_x, y, False, False)
-                    print(' ' * credits_width, end='')
-                for k in range(len(last_credits)):
-                    y = 2 + credits_height - len(last_credits) + k
-                    move(credits_pos_x, y, False, False)
-                    print(last_credits[k], end='')
-                    print(' ' * (credits_width - len(last_credits[k])), end='')
-                move(cursor_x, cursor_y, False, False)
-                print_lock.release()
-            else:
-                last_credits[-1] += ch
-                print_lock.acquire()
-                if is_draw_end:
-                    print_lock.release()
-                    break
-                move(credits_pos_x + credit_x, credits_height + 1, False, False)
-                print(ch, end='')
-                move(cursor_x, cursor_y, False, False)
-                print_lock.release()
-                credit_x += 1
-            while time.time() < currentTime:
-                time.sleep(0.01)
-
-
-################# Main ################
-begin_draw()
-clear()
-drawFrame()
-move(2, 2)
-time.sleep(1)
-
-startTime = time.time() * 100
-currentTime = 0
-currentLyric = 0
-currentCredit = 0
-x = 0
-y = 0
-
-while(lyrics[currentLyric].mode != 9):
-    currentTime = time.time() * 100 - startTime
-
-    if(currentTime > lyrics[currentLyric].time):
-
-        if(lyrics[currentLyric].mode <= 1 or lyrics[currentLyric].mode >= 5):
-            wordCount = len(lyrics[currentLyric].words)
-        if(wordCount == 0):
-            wordCount = 1
-
-        if(lyrics[currentLyric].interval < 0):
-            interval = (lyrics[currentLyric + 1].time -
-                        lyrics[currentLyric].time) / 100.0 / wordCount
+def creditsTask(startTime):
+    credit_x = 0
+    length = len(credits)
+    last_credits = collections.deque([""], maxlen=credits_height)
+    line = 0
+    for i, ch in enumerate(credits):
+        currentTime = startTime + credits_duration / length * i
+        if ch == '\n':
+            line += 1
+            yield currentTime, 'credits line %d' % line
+            credit_x = 0
+            last_credits.append("")
+            if enable_margins:
+                output('scroll', credits_pos_x, 2,
+                       credits_pos_x + credits_width - 1, credits_height + 1)
+                continue
+            # After a resize the panel may be lower than the deque
+            shown = list(last_credits)[-credits_height:]
+            for y in range(2, 2 + credits_height - len(shown)):
+                output('write', credits_pos_x, y, ' ' * credits_width)
+            for k in range(len(shown)):
+                y = 2 + credits_height - len(shown) + k
+                output('write', credits_pos_x, y,
+                       shown[k].ljust(credits_width))
+        else:
+            yield currentTime, None
+            last_credits[-1] += ch
+            if credit_x < credits_width:
+                output('write', credits_pos_x + credit_x,
+                       credits_height + 1, ch)
+            credit_x += 1
+
+
+def musicTask(scheduler, startTime):
+    yield startTime, None
+    scheduler.music_time = startTime
+    # The music cannot be played faster, nor can playsound seek
+    if scheduler.simulated or scheduler.speed != 1.0:
+        return
+    position = max(0.0, scheduler.start_at - startTime)
+    if audio_wav or audio_rate:
+        backend = wave_player(audio_wav) if audio_wav else fake_audio(audio_rate)
+        backend.start(position)
+        scheduler.audio = audio_clock(backend, startTime, scheduler.clock)
+    elif enable_sound and not position:
+        playsound.playsound(str(Path.cwd() / music_file), False)
+
+
+# Seconds the empty frame stays on screen before the first lyric
+lead_in = 2.0
+
+
+def lyricsTask(scheduler, plan):
+    yield 0.0, None
+    begin_draw()
+    drawFrame()
+    x = 0
+    y = 0
+    for currentLyric, l in enumerate(lyrics):
+        startTime, interval = plan[currentLyric]
+        startTime = lead_in + startTime / 100.0
+        if(l.mode == 2):
+            label = 'ASCII %d' % (l.words + 1)
+        elif(l.mode <= 1):
+            label = l.words.replace('\0', '') or '(blank line)'
         else:
-            interval = lyrics[currentLyric].interval / wordCount
+            label = '(mode %d)' % l.mode
+        yield startTime, label
 
-        if(lyrics[currentLyric].mode == 0):
-            x = drawLyrics(lyrics[currentLyric].words,
-                           x, y,
-                           interval,
-                           True)
+        if(l.mode == 0):
+            x = yield from drawLyrics(l.words, x, y, startTime, interval, True)
             y = y + 1
-        elif(lyrics[currentLyric].mode == 1):
-            x = drawLyrics(lyrics[currentLyric].words,
-                           x, y,
-                           interval,
-                           False)
-        elif(lyrics[currentLyric].mode == 2):
-            drawAA(ascii_art_x, ascii_art_y, lyrics[currentLyric].words)
+        elif(l.mode == 1):
+            x = yield from drawLyrics(l.words, x, y, startTime, interval, False)
+        elif(l.mode == 2):
+            yield from drawAA(art_steps[currentLyric], startTime, interval)
             move(x + 2, y + 2)
-        elif(lyrics[currentLyric].mode == 3):
+        elif(l.mode == 3):
             clearLyrics()
             x = 0
             y = 0
-        elif(lyrics[currentLyric].mode == 4):
-            if enable_sound:
-                playsound.playsound(str(Path.cwd() / 'sa1.mp3'), False)
-        elif(lyrics[currentLyric].mode == 5):
-            th_credit = thread_credits()
-            th_credit.daemon = True
-            th_credit.start()
-        currentLyric = currentLyric + 1
+        elif(l.mode == 4):
+            scheduler.spawn(musicTask(scheduler, startTime))
+        elif(l.mode == 5):
+            scheduler.spawn(creditsTask(startTime))
+        elif(l.mode == 9):
+            break
+    end_draw()
 
-    time.sleep(0.01)
 
-end_draw()
+def compileRecords(baud):
+    '''
+    Run the show on a virtual clock for the current terminal, planned for
+    a baud rate, and return the music start time in milliseconds (or
+    show_no_music), the bytes restoring the terminal, and a list of
+    [milliseconds, bytes] writes
+    '''
+    scheduler = timeline_scheduler(True)
+    records = []
+
+    def record(out):
+        ms = int(scheduler.now() * 1000)
+        data = b''.join(out)
+        if records and records[-1][0] == ms:
+            records[-1][1] += data
+        else:
+            records.append([ms, data])
+    writer.sink = record
+    scheduler.spawn(lyricsTask(scheduler, planLyrics(baud)))
+    scheduler.run()
+
+    if scheduler.music_time is None:
+        music = show_no_music
+    else:
+        music = int(scheduler.music_time * 1000)
+    return music, endSequence().encode(), records
+
+
+def compileFor(term, columns, lines, baud):
+    # Compile for another terminal than ours, this changes the globals
+    detectTerminal(term)
+    setupLayout(columns, lines)
+    return compileRecords(baud)
+
+
+def compileShow(path):
+    '''
+    Save the show for the current terminal, with the time of every
+    write, for --play
+    '''
+    music, end, records = compileRecords(baud_rate)
+    sound = music_file.encode()
+    with open(path, 'wb') as f:
+        f.write(show_header.pack(show_magic, term_columns, term_lines,
+                                 music, len(sound), len(end)))
+        f.write(sound)
+        f.write(end)
+        for ms, data in records:
+            f.write(show_record.pack(ms, len(data)))
+            f.write(data)
+
+
+def recordShow(path):
+    '''
+    Record the show for the current terminal on a virtual clock, as an
+    asciicast v2 file if `path` ends with .cast and as ttyrec otherwise.
+    Every write goes to the file as soon as it is produced
+    '''
+    scheduler = timeline_scheduler(True)
+    startTime = time.time()
+    is_cast = path.endswith('.cast')
+    with open(path, 'wb') as f:
+        if is_cast:
+            f.write(json.dumps({
+                'version': 2, 'width': term_columns, 'height': term_lines,
+                'timestamp': int(startTime), 'env': {'TERM': term},
+            }).encode() + b'\n')
+
+        def record(out):
+            data = b''.join(out)
+            if is_cast:
+                f.write(json.dumps([round(scheduler.now(), 6), 'o',
+                                    data.decode()]).encode() + b'\n')
+            else:
+                usec = int((startTime + scheduler.now()) * 1000000)
+                f.write(struct.pack('<III', usec // 1000000, usec % 1000000,
+                                    len(data)))
+                f.write(data)
+        writer.sink = record
+        scheduler.spawn(lyricsTask(scheduler, plan))
+        scheduler.run()
+
+
+def simulateShow(scheduler):
+    '''
+    Play the show on the simulated clock of `scheduler` with the ticks of
+    a real run, and report the bytes sent, the CPU time per byte and a
+    digest of the timestamped stream, which changes whenever anything is
+    sent differently or at another time
+    '''
+    import hashlib
+    global show_clock
+    show_clock = lambda: scheduler.loop.time() if scheduler.loop else 0.0
+    metrics.startTime = 0.0
+    digest = hashlib.sha1()
+
+    def send(out):
+        digest.update(b'%.6f ' % scheduler.now())
+        for data in out:
+            digest.update(data)
+    writer.sink = send
+    cpu = time.process_time()
+    scheduler.run()
+    cpu = time.process_time() - cpu
+    print("%d bytes in %d writes over %.1fs, %.3fs of CPU, %.2fus per byte" %
+          (metrics.bytes, metrics.flushes, scheduler.now(), cpu,
+           cpu / max(metrics.bytes, 1) * 1000000))
+    print("stream digest %s" % digest.hexdigest())
+
+
+def benchmarkShow(baud):
+    '''
+    Run the show against a pseudo-terminal whose reader drains the bytes
+    at a simulated line rate, and report how late the last byte of every
+    lyric event and ASCII art reached the "terminal"
+    '''
+    import pty
+    import tty
+    master, slave = pty.openpty()
+    tty.setraw(slave)
+    scheduler = timeline_scheduler()
+    scheduler.tick = tickLength(baud)
+    written = [0, 0]
+    # (bytes received so far, time the last of them left the line)
+    arrivals = []
+    # lateness index -> (deadline, bytes written) of the last step of an
+    # event which wrote anything, steps waiting for their tick
+    events = {}
+    waiting = []
+    queued = [0]
+
+    def send(out):
+        data = b''.join(out)
+        writeAll(slave, data)
+        written[0] += len(data)
+
+    def observe(event, deadline):
+        # A step drew if it queued commands or if they were written
+        drew = len(writer.commands) > queued[0] or written[0] > written[1]
+        if event is not None and drew:
+            waiting.append((event, deadline))
+        if written[0] > written[1]:
+            for event, deadline in waiting:
+                events[event] = (deadline, written[0])
+            del waiting[:]
+        written[1] = written[0]
+        queued[0] = len(writer.commands)
+
+    def drain():
+        received = 0
+        line = 0.0
+        while True:
+            # Never read more than 10ms of line time at once
+            data = os.read(master, max(baud // 1000, 1))
+            line = max(line, scheduler.now()) + len(data) * 10.0 / baud
+            received += len(data)
+            arrivals.append((received, line))
+            delay = line - scheduler.now()
+            if delay > 0:
+                time.sleep(delay)
+
+    writer.sink = send
+    scheduler.observer = observe
+    reader = threading.Thread(target=drain, daemon=True)
+    reader.start()
+    scheduler.spawn(lyricsTask(scheduler, plan))
+    scheduler.run()
+    while not arrivals or arrivals[-1][0] < written[0]:
+        time.sleep(0.05)
+
+    received = [a[0] for a in arrivals]
+    late = []
+    for event, (deadline, size) in sorted(events.items()):
+        label = scheduler.lateness[event][0]
+        if label.startswith('credits'):
+            continue
+        count, line = arrivals[bisect.bisect_left(received, size)]
+        arrival = line - (count - size) * 10.0 / baud
+        late.append((label, deadline, arrival - deadline))
+        print("  %7.2fs  %+8.1fms  %s" % (deadline, (arrival - deadline) * 1000, label))
+    worst = sorted(e[2] for e in late)
+    print("%d bps, %d bytes, %d events, mean lateness %.1fms, "
+          "95%% %.1fms, max %.1fms" %
+          (baud, written[0], len(late), sum(worst) / len(worst) * 1000,
+           worst[len(worst) * 95 // 100] * 1000, worst[-1] * 1000))
+
+
+# Telnet commands and options used by --serve
+IAC, DONT, DO, WONT, WILL, SB, SE = 255, 254, 253, 252, 251, 250, 240
+BINARY, ECHO, SGA, TTYPE, NAWS = 0, 1, 3, 24, 31
+TTYPE_IS, TTYPE_SEND = 0, 1
+
+# A show is compiled for every terminal a client reports, so only these
+# types and sizes are taken. Anything else gets an 80x24 vt100
+served_terms = frozenset([
+    'vt100', 'vt102', 'vt220', 'vt320', 'vt420', 'vt520', 'linux', 'ansi',
+    'xterm', 'xterm-color', 'xterm-256color', 'screen', 'screen-256color',
+    'tmux', 'tmux-256color', 'rxvt', 'rxvt-unicode', 'putty'])
+served_max_size = 255
+# Compiled shows kept for new sessions, a session keeps the one it plays
+served_shows = 16
+
+
+class telnet_session:
+    '''
+    One client of --serve. Reads the client's window size (NAWS) and
+    terminal type (TTYPE) from the telnet negotiation, a raw TCP client
+    which does not answer gets an 80x24 vt100
+    '''
+    def __init__(self, reader, stream):
+        self.reader = reader
+        self.stream = stream
+        self.columns = 80
+        self.lines = 24
+        self.term = 'vt100'
+        self.pending = {NAWS, TTYPE}
+        self.negotiated = asyncio.Event()
+
+    def answered(self, option):
+        self.pending.discard(option)
+        if not self.pending:
+            self.negotiated.set()
+
+    async def negotiate(self):
+        self.stream.write(bytes([IAC, DO, NAWS, IAC, DO, TTYPE,
+                                 IAC, WILL, ECHO, IAC, WILL, SGA,
+                                 IAC, WILL, BINARY, IAC, DO, BINARY]))
+        try:
+            await asyncio.wait_for(self.negotiated.wait(), 2.0)
+        except asyncio.TimeoutError:
+            pass
+
+    async def read(self):
+        # Keep reading for the whole session, keys are ignored
+        data = b''
+        while True:
+            chunk = await self.reader.read(1024)
+            if not chunk:
+                return
+            data = self.parse(data + chunk)
+
+    def parse(self, data):
+        # Handle the complete commands in data, return what is left
+        while IAC in data:
+            i = data.index(IAC)
+            if i + 1 >= len(data):
+                return data[i:]
+            cmd = data[i + 1]
+            if cmd in (DO, DONT, WILL, WONT):
+                if i + 2 >= len(data):
+                    return data[i:]
+                option = data[i + 2]
+                if cmd == WILL and option == TTYPE:
+                    self.stream.write(bytes([IAC, SB, TTYPE, TTYPE_SEND, IAC, SE]))
+                elif cmd == WONT:
+                    self.answered(option)
+                data = data[i + 3:]
+            elif cmd == SB:
+                end = data.find(bytes([IAC, SE]), i)
+                if end < 0:
+                    return data[i:]
+                sub = data[i + 2:end].replace(bytes([IAC, IAC]), bytes([IAC]))
+                if sub[:1] == bytes([NAWS]) and len(sub) >= 5:
+                    columns, lines = struct.unpack('>HH', sub[1:5])
+                    if max(columns, lines) <= served_max_size:
+                        self.columns, self.lines = columns, lines
+                    self.answered(NAWS)
+                elif sub[:2] == bytes([TTYPE, TTYPE_IS]):
+                    term = sub[2:].decode('ascii', 'replace').lower()
+                    if term in served_terms:
+                        self.term = term
+                    self.answered(TTYPE)
+                data = data[end + 2:]
+            else:
+                data = data[i + 2:]
+        return b''
+
+
+class show_server:
+    '''
+    Serves the show to many telnet clients from one asyncio loop. The show
+    is compiled once for every (TERM, columns, lines) and shared by every
+    session with that terminal, a session only writes the bytes at their
+    time
+    '''
+    def __init__(self):
+        self.shows = {}
+        # Compiling changes the layout globals, one at a time
+        self.compiler = concurrent.futures.ThreadPoolExecutor(1)
+
+    def compile(self, term, columns, lines):
+        music, end, records = compileFor(term, columns, lines, baud_rate)
+        return [(ms, data.replace(bytes([IAC]), bytes([IAC, IAC])))
+                for ms, data in records]
+
+    def show(self, term, columns, lines):
+        key = (term, columns, lines)
+        if key not in self.shows:
+            if len(self.shows) >= served_shows:
+                del self.shows[next(iter(self.shows))]
+            self.shows[key] = asyncio.get_running_loop().run_in_executor(
+                self.compiler, self.compile, term, columns, lines)
+        return self.shows[key]
+
+    async def session(self, reader, stream):
+        session = telnet_session(reader, stream)
+        reading = asyncio.get_running_loop().create_task(session.read())
+        try:
+            await session.negotiate()
+            if session.columns < 80 or session.lines < 24:
+                stream.write(b"the terminal size should be at least 80x24\r\n")
+            else:
+                records = await self.show(session.term, session.columns,
+                                          session.lines)
+                loop = asyncio.get_running_loop()
+                startTime = loop.time()
+                for ms, data in records:
+                    if reading.done():
+                        break
+                    delay = startTime + ms / 1000.0 - loop.time()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    stream.write(data)
+                    await stream.drain()
+        except ConnectionError:
+            pass
+        finally:
+            reading.cancel()
+            stream.close()
+
+    async def main(self, host, port):
+        server = await asyncio.start_server(self.session, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+def serveShow(address):
+    host, _, port = address.rpartition(':')
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    try:
+        asyncio.run(show_server().main(host or 'localhost', int(port)))
+    except KeyboardInterrupt:
+        pass
+
+
+class serial_port:
+    '''
+    One terminal of --ports. The fd is non-blocking and writes are paced
+    to the port's baud rate, about 10ms of line time at once, so a slow
+    port only delays itself
+    '''
+    def __init__(self, spec):
+        fields = spec.split(':')
+        self.path = fields[0]
+        self.baud = int(fields[1]) if len(fields) > 1 else 19200
+        self.term = fields[2] if len(fields) > 2 else 'vt100'
+        self.columns, self.lines = 80, 24
+        if len(fields) > 3:
+            self.columns, self.lines = map(int, fields[3].split('x'))
+        self.fd = None
+        self.line_free = 0.0
+        self.end = b''
+        self.done = False
+
+    def open(self):
+        import termios
+        import tty
+        speed = getattr(termios, 'B%d' % self.baud)
+        fd = os.open(self.path, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+        try:
+            self.saved = termios.tcgetattr(fd)
+        except termios.error:
+            os.close(fd)
+            raise OSError("%s is not a terminal" % self.path)
+        self.fd = fd
+        tty.setraw(self.fd)
+        attr = termios.tcgetattr(self.fd)
+        attr[4] = attr[5] = speed
+        termios.tcsetattr(self.fd, termios.TCSANOW, attr)
+
+    async def writable(self):
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+        loop.add_writer(self.fd, ready.set_result, None)
+        try:
+            await ready
+        finally:
+            loop.remove_writer(self.fd)
+
+    async def write(self, data):
+        loop = asyncio.get_running_loop()
+        chunk = max(self.baud // 1000, 1)
+        data = memoryview(data)
+        while data:
+            delay = self.line_free - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                size = os.write(self.fd, data[:chunk])
+            except BlockingIOError:
+                await self.writable()
+                continue
+            self.line_free = max(self.line_free, loop.time()) + \
+                size * 10.0 / self.baud
+            data = data[size:]
+
+    async def play(self, records, startTime):
+        loop = asyncio.get_running_loop()
+        for ms, data in records:
+            delay = startTime + ms / 1000.0 - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self.write(data)
+        self.done = True
+
+    def restore(self):
+        # Reset a terminal left in the middle of the show, then give the
+        # tty its settings back
+        import termios
+        if self.fd is None:
+            return
+        os.set_blocking(self.fd, True)
+        if not self.done:
+            writeAll(self.fd, self.end)
+        termios.tcdrain(self.fd)
+        termios.tcsetattr(self.fd, termios.TCSADRAIN, self.saved)
+        os.close(self.fd)
+        self.fd = None
+
+
+def fanOutShow(spec):
+    '''
+    Drive several serial terminals from one clock. Every port plays the
+    show compiled for its terminal and baud rate, ports with the same
+    settings share one compiled show
+    '''
+    async def main(music):
+        loop = asyncio.get_running_loop()
+        startTime = loop.time()
+        if enable_sound and music != show_no_music:
+            loop.call_at(startTime + music / 1000.0, playsound.playsound,
+                         str(Path.cwd() / music_file), False)
+        await asyncio.gather(*[port.play(port.records, startTime)
+                               for port in ports])
+
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    ports = []
+    try:
+        try:
+            for p in spec.split(','):
+                ports.append(serial_port(p))
+                ports[-1].open()
+        except (ValueError, AttributeError, OSError) as e:
+            print("--ports: %s" % e)
+            sys.exit(1)
+        shows = {}
+        for port in ports:
+            key = (port.term, port.columns, port.lines, port.baud)
+            if key not in shows:
+                shows[key] = compileFor(*key)
+            port.music, port.end, port.records = shows[key]
+        asyncio.run(main(min(port.music for port in ports)))
+    except KeyboardInterrupt:
+        print('Interrupt by user')
+    finally:
+        # Also on errors and Ctrl-C, every port opened is put back
+        for port in ports:
+            port.restore()
+
+
+################# Main ################
+try:
+    plan = planLyrics(baud_rate)
+except ValueError as e:
+    print(e)
+    sys.exit(1)
+
+if compile_path:
+    compileShow(compile_path)
+    sys.exit(0)
+
+if record_path:
+    recordShow(record_path)
+    sys.exit(0)
+
+if benchmark_baud:
+    benchmarkShow(benchmark_baud)
+    sys.exit(0)
+
+if serve_address:
+    serveShow(serve_address)
+    sys.exit(0)
+
+if ports_spec:
+    fanOutShow(ports_spec)
+    sys.exit(0)
+
+scheduler = asyncio_scheduler(enable_simulate)
+scheduler.speed = speed
+scheduler.tick = tickLength(baud_rate)
+if enable_drain and not enable_simulate:
+    if not sys.stdout.isatty():
+        print("--drain paces the output of a tty, stdout is not one")
+        sys.exit(1)
+    scheduler.line = tty_line(sys.stdout.fileno())
+    scheduler.tick = tickLength(baud_rate or scheduler.line.rate * 10)
+if start_at:
+    # Song positions count from the start of the music
+    music = next(i for i, l in enumerate(lyrics) if l.mode == 4)
+    scheduler.start_at = lead_in + plan[music][0] / 100.0 + start_at
+    if scheduler.start_at >= lead_in + plan[-1][0] / 100.0:
+        print("--start-at is past the end of the song")
+        sys.exit(1)
+scheduler.spawn(lyricsTask(scheduler, plan))
+if enable_simulate:
+    simulateShow(scheduler)
+else:
+    scheduler.run()
+
+if enable_timing:
+    scheduler.report()